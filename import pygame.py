@@ -1,10 +1,27 @@
+import time
+# Отсчёт для замера времени до первого кадра (--startup-time)
+START_TIME = time.perf_counter()
+
 import pygame
+import numpy as np
 import random
 import sys
 import math
-
-# Инициализация Pygame
-pygame.init()
+import argparse
+import json
+import csv
+import os
+import platform
+import struct
+import zlib
+import itertools
+import hashlib
+import inspect
+import threading
+import queue
+import sqlite3
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from collections import OrderedDict, defaultdict, deque
 
 # Константы
 SCREEN_WIDTH = 800
@@ -18,6 +35,18 @@ BOX_WIDTH = 40
 BOX_HEIGHT = 40
 SPEED_INCREMENT = 0.2
 MAX_SPEED = 15
+# Баланс: цели уровней, частота появления и разброс скоростей
+START_TARGET = 10
+TARGET_STEP = 5
+PERSON_SPAWN_INTERVAL = 60
+BOX_SPAWN_INTERVAL = 90
+DECORATION_SPAWN_INTERVAL = 40
+PERSON_SPEED_RANGE = (2, 5)
+BOX_SPEED_RANGE = (3, 6)
+# Жёсткие ограничения на число сущностей каждого вида одновременно
+MAX_PEOPLE = 64
+MAX_BOXES = 32
+MAX_DECORATIONS = 32
 
 # Цвета
 BLACK = (0, 0, 0)
@@ -40,13 +69,29 @@ NIGHT_BLUE = (25, 25, 112)
 MOON_LIGHT = (220, 220, 220)
 STAR_COLOR = (255, 255, 200)
 
-# Настройка экрана
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Городское безумие")
+# Возможные действия игрока для Game.step()
+ACTIONS = [None, "left", "right"]
+CAR_TYPES = ["mercedes", "bmw", "lamborghini", "zhiguli"]
+CAR_COLORS = [RED, BLUE, GREEN, YELLOW, PURPLE, SILVER, BLACK, ORANGE]
+TIME_OF_DAY_OPTIONS = ["day", "night", "sunset"]
+
+# Настройка экрана: окно создаётся только при запуске игры,
+# симуляция (Game.step) работает и без него
+screen = None
 clock = pygame.time.Clock()
 
+def init_display():
+    global screen
+    if screen is None:
+        # Поднимаем только нужные подсистемы: без звука и джойстиков
+        pygame.display.init()
+        pygame.font.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Городское безумие")
+    return screen
+
 # Загрузка изображений (заглушки, которые мы нарисуем сами)
-def create_car_surface(color, car_type):
+def create_car_surface(color, car_type, highlight=True):
     surface = pygame.Surface((CAR_WIDTH, CAR_HEIGHT), pygame.SRCALPHA)
     
     # Базовые цвета для деталей
@@ -178,9 +223,10 @@ def create_car_surface(color, car_type):
         pygame.draw.rect(surface, BLACK, (CAR_WIDTH-25, 40, 5, 2))
     
     # Добавляем блики для реалистичности
-    highlight = pygame.Surface((CAR_WIDTH, CAR_HEIGHT), pygame.SRCALPHA)
-    pygame.draw.ellipse(highlight, (255, 255, 255, 30), (CAR_WIDTH//2, 10, CAR_WIDTH//2, 20))
-    surface.blit(highlight, (0, 0))
+    if highlight:
+        glare = pygame.Surface((CAR_WIDTH, CAR_HEIGHT), pygame.SRCALPHA)
+        pygame.draw.ellipse(glare, (255, 255, 255, 30), (CAR_WIDTH//2, 10, CAR_WIDTH//2, 20))
+        surface.blit(glare, (0, 0))
     
     return surface
 
@@ -213,12 +259,11 @@ def create_box_surface():
     pygame.draw.line(surface, BROWN, (0, 0), (BOX_WIDTH, BOX_HEIGHT), 2)
     pygame.draw.line(surface, BROWN, (BOX_WIDTH, 0), (0, BOX_HEIGHT), 2)
     # Надпись
-    font = pygame.font.SysFont(None, 20)
-    text = font.render("FRAGILE", True, BLACK)
+    text = render_text("FRAGILE", 20, BLACK)
     surface.blit(text, (BOX_WIDTH//2 - text.get_width()//2, BOX_HEIGHT//2 - text.get_height()//2))
     return surface
 
-def create_tree_surface():
+def create_tree_surface(rng=random):
     surface = pygame.Surface((60, 100), pygame.SRCALPHA)
     # Ствол
     pygame.draw.rect(surface, BROWN, (25, 50, 10, 50))
@@ -226,20 +271,20 @@ def create_tree_surface():
     pygame.draw.circle(surface, DARK_GREEN, (30, 40), 25)
     # Детализация кроны
     for _ in range(10):
-        x = random.randint(10, 50)
-        y = random.randint(20, 60)
-        r = random.randint(3, 8)
+        x = rng.randint(10, 50)
+        y = rng.randint(20, 60)
+        r = rng.randint(3, 8)
         pygame.draw.circle(surface, (0, 120, 0), (x, y), r)
     return surface
 
-def create_house_surface():
+def create_house_surface(rng=random):
     surface = pygame.Surface((80, 80), pygame.SRCALPHA)
     # Основной корпус
     pygame.draw.rect(surface, RED, (0, 30, 80, 50))
     # Кирпичная текстура
     for i in range(0, 80, 10):
         for j in range(30, 80, 5):
-            pygame.draw.rect(surface, (180, 0, 0 if (i+j) % 20 == 0 else 150, 0, 0), (i, j, 10, 5), 1)
+            pygame.draw.rect(surface, (180, 0, 0) if (i+j) % 20 == 0 else (150, 0, 0), (i, j, 10, 5), 1)
     # Крыша
     pygame.draw.polygon(surface, BROWN, [(0, 30), (40, 0), (80, 30)])
     # Черепица
@@ -257,7 +302,7 @@ def create_house_surface():
     pygame.draw.circle(surface, BLACK, (65, 62), 2)  # Ручка
     return surface
 
-def create_rocket_surface():
+def create_rocket_surface(rng=random):
     surface = pygame.Surface((40, 80), pygame.SRCALPHA)
     # Корпус ракеты
     pygame.draw.rect(surface, (150, 150, 150), (10, 0, 20, 60))
@@ -273,11 +318,797 @@ def create_rocket_surface():
     pygame.draw.polygon(surface, (255, 0, 0), [(12, 60), (28, 60), (20, 75)])
     # Пламя
     for i in range(5):
-        x = random.randint(12, 28)
-        y = random.randint(65, 78)
-        pygame.draw.circle(surface, (255, 255, 0), (x, y), random.randint(1, 3))
+        x = rng.randint(12, 28)
+        y = rng.randint(65, 78)
+        pygame.draw.circle(surface, (255, 255, 0), (x, y), rng.randint(1, 3))
+    return surface
+
+DECORATION_FACTORIES = {
+    "tree": create_tree_surface,
+    "house": create_house_surface,
+    "rocket": create_rocket_surface
+}
+
+def create_decoration_surface(type_name, variant):
+    # Свой генератор, чтобы рисование не сдвигало общий random симуляции
+    return DECORATION_FACTORIES[type_name](random.Random(variant))
+
+# Кэш спрайтов: одинаковые поверхности рисуются один раз и раздаются всем
+class SpriteCache:
+    def __init__(self, max_size=96):
+        # Все спрайты атласа: 4 машины × 8 цветов × с бликами и без, человек,
+        # коробка и по 8 вариантов трёх декораций — 90 ключей. LRU ограничивает
+        # только машины нестандартных цветов
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        # Маски столкновений по тем же ключам; их немного, и они не вытесняются.
+        # Поверхность для маски рисуется отдельно и в LRU не попадает
+        self.masks = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, factory, *args):
+        key = (factory, *args)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        
+        self.misses += 1
+        surface = factory(*args)
+        if pygame.display.get_surface() is not None:
+            if surface.get_flags() & pygame.SRCALPHA:
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+    
+    def get_mask(self, factory, *args):
+        key = (factory, *args)
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = pygame.mask.from_surface(factory(*args))
+            self.masks[key] = mask
+        return mask
+    
+    def clear(self):
+        self.surfaces.clear()
+        self.masks.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.surfaces),
+            "masks": len(self.masks),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+sprite_cache = SpriteCache()
+# Крупные поверхности сцены — полоса дороги, маски и полосы света, фонари —
+# отдельно: ключей у них немного, и спрайты их не вытесняют, пока нет атласа
+scene_cache = SpriteCache(max_size=16)
+
+def get_car_surface(color, car_type):
+    highlight = governor.settings["highlight"]
+    surface = sprite_atlas.get(atlas_car_name(color, car_type, highlight))
+    if surface is None:
+        surface = sprite_cache.get(create_car_surface, tuple(color), car_type, highlight)
+    return surface
+
+def get_person_surface():
+    return sprite_atlas.get("person") or sprite_cache.get(create_person_surface)
+
+def get_box_surface():
+    return sprite_atlas.get("box") or sprite_cache.get(create_box_surface)
+
+# Маски для точных столкновений. Форма машины от цвета и бликов не зависит,
+# поэтому маска одна на модель
+def get_car_mask(car_type):
+    return sprite_cache.get_mask(create_car_surface, WHITE, car_type, False)
+
+def get_person_mask():
+    return sprite_cache.get_mask(create_person_surface)
+
+def get_box_mask():
+    # Коробка — сплошной прямоугольник, и маска строится без отрисовки:
+    # надпись на ней подняла бы pygame.font в симуляции без окна
+    key = (create_box_surface,)
+    mask = sprite_cache.masks.get(key)
+    if mask is None:
+        mask = sprite_cache.masks[key] = pygame.Mask((BOX_WIDTH, BOX_HEIGHT), fill=True)
+    return mask
+
+def masks_overlap(mask_a, xa, ya, mask_b, xb, yb):
+    offset = (int(round(float(xb - xa))), int(round(float(yb - ya))))
+    return mask_a.overlap(mask_b, offset) is not None
+
+def get_decoration_surface(type_name, variant):
+    # Вариантов каждой декорации конечное число, все они лежат в атласе
+    variant %= ATLAS_VARIANTS
+    surface = sprite_atlas.get(f"{type_name}/{variant}")
+    if surface is None:
+        surface = sprite_cache.get(create_decoration_surface, type_name, variant)
+    return surface
+
+# Атлас спрайтов на диске: все машины во всех цветах, человек, коробка и
+# ATLAS_VARIANTS вариантов каждой декорации упакованы в один PNG, рядом —
+# JSON с прямоугольниками. Ключ атласа — хэш исходников рисующих функций и
+# списка спрайтов, так что атлас пересобирается только при их изменении.
+# Лежит в кэше пользователя: у каталога со скриптом может не быть прав на запись
+APP_NAME = "2d-igra"
+
+def user_cache_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~/AppData/Local")
+        return os.path.join(base, APP_NAME, "cache")
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~/Library/Caches"), APP_NAME)
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), APP_NAME)
+
+def user_data_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~/AppData/Roaming")
+        return os.path.join(base, APP_NAME)
+    if sys.platform == "darwin":
+        return os.path.join(os.path.expanduser("~/Library/Application Support"), APP_NAME)
+    return os.path.join(os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share"), APP_NAME)
+
+ATLAS_DIR = os.path.join(user_cache_dir(), "atlas")
+ATLAS_VARIANTS = 8
+ATLAS_WIDTH = 1024
+ATLAS_PADDING = 1
+
+def atlas_car_name(color, car_type, highlight):
+    r, g, b = color[:3]
+    return f"car/{car_type}/{r},{g},{b}/{int(highlight)}"
+
+def atlas_entries():
+    entries = [("person", create_person_surface, ()), ("box", create_box_surface, ())]
+    for car_type in CAR_TYPES:
+        for color in CAR_COLORS:
+            for highlight in (True, False):
+                entries.append((atlas_car_name(color, car_type, highlight), create_car_surface,
+                                (color, car_type, highlight)))
+    for type_name in DECORATION_FACTORIES:
+        for variant in range(ATLAS_VARIANTS):
+            entries.append((f"{type_name}/{variant}", create_decoration_surface, (type_name, variant)))
+    return entries
+
+def code_names(code):
+    # Имена, которые читает функция, включая вложенные генераторы и лямбды
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= code_names(const)
+    return names
+
+def atlas_sources(factories):
+    # Исходники фабрик и всех функций модуля, которые они вызывают, и значения
+    # прочитанных ими констант: смена размера или цвета тоже меняет ключ
+    sources = {}
+    constants = {}
+    stack = list(factories)
+    while stack:
+        fn = stack.pop()
+        if fn.__name__ in sources:
+            continue
+        sources[fn.__name__] = inspect.getsource(fn)
+        for name in code_names(fn.__code__):
+            if name not in fn.__globals__:
+                continue
+            value = fn.__globals__[name]
+            values = list(value.values()) if isinstance(value, dict) else [value]
+            stack.extend(v for v in values if inspect.isfunction(v) and v.__module__ == fn.__module__)
+            # Константы модуля пишутся заглавными; изменяемое состояние вроде
+            # render_scale на картинку спрайта не влияет
+            if name.isupper() and all(isinstance(v, (int, float, str, tuple, list)) for v in values):
+                constants[name] = value
+    return sources, constants
+
+def atlas_key(entries):
+    digest = hashlib.sha1()
+    factories = {factory for _, factory, _ in entries} | set(DECORATION_FACTORIES.values())
+    sources, constants = atlas_sources(factories)
+    for name in sorted(sources):
+        digest.update(sources[name].encode("utf-8"))
+    for name in sorted(constants):
+        digest.update(repr((name, constants[name])).encode("utf-8"))
+    for name, _, args in entries:
+        digest.update(repr((name, args)).encode("utf-8"))
+    digest.update(pygame.version.ver.encode("ascii"))
+    return digest.hexdigest()
+
+def pack_shelves(sizes, width=ATLAS_WIDTH, padding=ATLAS_PADDING):
+    # Полки: спрайты по убыванию высоты кладутся в ряд, пока влезают по ширине
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    rects = [None] * len(sizes)
+    x = y = shelf = 0
+    for i in order:
+        w, h = sizes[i]
+        if x + w > width:
+            x, y, shelf = 0, y + shelf + padding, 0
+        rects[i] = (x, y, w, h)
+        x += w + padding
+        shelf = max(shelf, h)
+    return rects, y + shelf
+
+class SpriteAtlas:
+    def __init__(self, directory=ATLAS_DIR):
+        self.image_path = os.path.join(directory, "atlas.png")
+        self.index_path = os.path.join(directory, "atlas.json")
+        self.image = None
+        self.sprites = {}
+        self.pending = {}
+        self.entries = None
+        self.key = None
+        self.source = None
+        self.build_ms = 0.0
+        self.save_error = None
+    
+    def get(self, name):
+        return self.sprites.get(name)
+    
+    def prepare(self):
+        if self.entries is None:
+            self.entries = atlas_entries()
+            self.key = atlas_key(self.entries)
+    
+    def load(self):
+        # Готовый атлас подходит, только если совпал ключ
+        self.prepare()
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("key") != self.key:
+                return False
+            self.install(pygame.image.load(self.image_path), index["sprites"])
+        except (OSError, pygame.error, ValueError, KeyError):
+            # Битый или недописанный атлас просто пересобирается
+            return False
+        self.source = "disk"
+        return True
+    
+    def render(self, name, factory, args):
+        self.pending[name] = factory(*args)
+    
+    def finish(self):
+        # Упаковка нарисованных спрайтов в один PNG и индекс
+        start = time.perf_counter()
+        names = list(self.pending)
+        rects, height = pack_shelves([self.pending[name].get_size() for name in names])
+        image = pygame.Surface((ATLAS_WIDTH, height), pygame.SRCALPHA)
+        for name, rect in zip(names, rects):
+            # MAX по пустому фону — точная копия пикселей вместе с полупрозрачностью
+            image.blit(self.pending[name], rect[:2], special_flags=pygame.BLEND_RGBA_MAX)
+        index = {"key": self.key, "sprites": dict(zip(names, rects))}
+        self.save(image, index)
+        self.pending.clear()
+        self.install(image, index["sprites"])
+        self.source = "build"
+        self.build_ms += (time.perf_counter() - start) * 1000
+    
+    def save(self, image, index):
+        # Файл атласа только ускоряет следующий запуск: если записать его
+        # не вышло, игра продолжает с атласом в памяти. Оба файла пишутся во
+        # временные и подменяются целиком, индекс последним — прерванная
+        # запись не оставляет битый PNG рядом с подходящим ключом
+        directory = os.path.dirname(self.image_path)
+        image_tmp = os.path.join(directory, f"atlas-{os.getpid()}.tmp.png")
+        index_tmp = self.index_path + f".{os.getpid()}.tmp"
+        try:
+            os.makedirs(directory, exist_ok=True)
+            pygame.image.save(image, image_tmp)
+            with open(index_tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(image_tmp, self.image_path)
+            os.replace(index_tmp, self.index_path)
+        except (OSError, pygame.error) as exc:
+            for path in (image_tmp, index_tmp):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.save_error = str(exc)
+            print(f"atlas: не удалось сохранить {self.image_path}: {exc}", file=sys.stderr)
+            return False
+        self.save_error = None
+        return True
+    
+    def build(self):
+        start = time.perf_counter()
+        self.prepare()
+        for entry in self.entries:
+            self.render(*entry)
+        self.build_ms = (time.perf_counter() - start) * 1000
+        self.finish()
+    
+    def queue_build(self, warmup):
+        # Сборка по спрайту за задачу, чтобы не останавливать меню
+        self.prepare()
+        for entry in self.entries:
+            warmup.add(self.render, *entry)
+        warmup.add(self.finish)
+    
+    def load_or_queue_build(self, warmup):
+        if not self.load():
+            self.queue_build(warmup)
+    
+    def install(self, image, rects):
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha()
+        # Подповерхности делят пиксели с общей текстурой атласа
+        self.sprites = {name: image.subsurface(rect) for name, rect in rects.items()}
+        self.image = image
+    
+    def stats(self):
+        return {
+            "sprites": len(self.sprites),
+            "source": self.source,
+            "size": self.image.get_size() if self.image is not None else None,
+            "build_ms": self.build_ms,
+            "save_error": self.save_error
+        }
+
+sprite_atlas = SpriteAtlas()
+
+# Кэш шрифтов и отрисованного текста: SysFont ищет системный шрифт, это дорого
+class TextCache:
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get_font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.SysFont(None, size)
+            self.fonts[size] = font
+        return font
+    
+    def render(self, text, size, color, antialias=True):
+        key = (text, size, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        
+        self.misses += 1
+        surface = self.get_font(size).render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+    
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.surfaces),
+            "fonts": len(self.fonts),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+text_cache = TextCache()
+
+def render_text(text, size, color, antialias=True):
+    return text_cache.render(text, size, color, antialias)
+
+def draw_text(text, size, color, pos, center=False):
+    surface = render_text(text, size, color, governor.settings["antialias"])
+    x, y = pos
+    if center:
+        x -= surface.get_width() // 2
+    blit(surface, (x, y))
+    return surface
+
+# Запечённый фон для каждого времени суток: небо, солнце/луна, звёзды,
+# обочины и асфальт. Пересоздаётся при смене разрешения
+TWINKLE_STARS = True
+STAR_SEED = 2024
+STAR_COUNT = 50
+
+def create_star_field():
+    # Звёзды ночного неба со своим генератором, чтобы не трогать общий random.
+    # Фон и мерцание берут их из одного списка: мерцает та же звезда, что запечена
+    rng = random.Random(STAR_SEED)
+    stars = []
+    for _ in range(STAR_COUNT):
+        brightness = rng.randint(200, 255)
+        x, y = rng.randint(0, SCREEN_WIDTH), rng.randint(0, SCREEN_HEIGHT//2)
+        stars.append({"x": x, "y": y, "size": rng.randint(1, 3), "brightness": brightness})
+    return stars
+
+def create_background_surface(time_of_day):
+    surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    
+    if time_of_day == "day":
+        # Дневное небо
+        surface.fill(LIGHT_BLUE)
+        # Солнце
+        pygame.draw.circle(surface, YELLOW, (SCREEN_WIDTH - 100, 100), 40)
+        # Облака
+        for i in range(3):
+            x = (SCREEN_WIDTH // 4) * i + 50
+            y = 80 + (i * 20)
+            pygame.draw.circle(surface, WHITE, (x, y), 20)
+            pygame.draw.circle(surface, WHITE, (x+15, y-10), 15)
+            pygame.draw.circle(surface, WHITE, (x+30, y), 20)
+            pygame.draw.circle(surface, WHITE, (x+15, y+10), 15)
+    
+    elif time_of_day == "night":
+        # Ночное небо
+        surface.fill(NIGHT_BLUE)
+        # Луна
+        pygame.draw.circle(surface, MOON_LIGHT, (SCREEN_WIDTH - 100, 100), 30)
+        pygame.draw.circle(surface, NIGHT_BLUE, (SCREEN_WIDTH - 120, 90), 25)
+        # Звезды
+        for star in create_star_field():
+            brightness = star["brightness"]
+            pygame.draw.circle(surface, (brightness, brightness, 200), (star["x"], star["y"]), star["size"])
+    
+    elif time_of_day == "sunset":
+        # Закатное небо
+        surface.fill((255, 140, 90))
+        # Заходящее солнце
+        pygame.draw.circle(surface, ORANGE, (SCREEN_WIDTH - 100, 150), 50)
+        pygame.draw.circle(surface, (255, 200, 100), (SCREEN_WIDTH - 100, 150), 35)
+    
+    road_left = (SCREEN_WIDTH - ROAD_WIDTH) // 2
+    # Обочины
+    pygame.draw.rect(surface, GREEN, (road_left - 20, 0, 20, SCREEN_HEIGHT))
+    pygame.draw.rect(surface, GREEN, (road_left + ROAD_WIDTH, 0, 20, SCREEN_HEIGHT))
+    # Асфальт
+    pygame.draw.rect(surface, GRAY, (road_left, 0, ROAD_WIDTH, SCREEN_HEIGHT))
+    return surface
+
+class BackgroundCache:
+    def __init__(self):
+        self.surfaces = {}
+        self.size = None
+    
+    def get(self, time_of_day, size=(SCREEN_WIDTH, SCREEN_HEIGHT)):
+        if size != self.size:
+            # Разрешение изменилось — старые фоны больше не подходят
+            self.surfaces.clear()
+            self.size = size
+        surface = self.surfaces.get(time_of_day)
+        if surface is None:
+            surface = create_background_surface(time_of_day)
+            if size != surface.get_size():
+                surface = pygame.transform.smoothscale(surface, size)
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert()
+            self.surfaces[time_of_day] = surface
+        return surface
+    
+    def clear(self):
+        self.surfaces.clear()
+        self.size = None
+
+background_cache = BackgroundCache()
+
+# Бесшовная по вертикали полоса дороги: обочины, асфальт и разметка.
+# Высота кратна шагу разметки, поэтому два blit со сдвигом закрывают экран
+ROAD_LINE_SPACING = 50
+ROAD_LINE_OFFSET = 10
+
+def create_road_surface():
+    height = -(-SCREEN_HEIGHT // ROAD_LINE_SPACING) * ROAD_LINE_SPACING
+    surface = pygame.Surface((ROAD_WIDTH + 40, height))
+    # Обочины
+    surface.fill(GREEN)
+    # Асфальт
+    pygame.draw.rect(surface, GRAY, (20, 0, ROAD_WIDTH, height))
+    # Разметка
+    for y in range(ROAD_LINE_OFFSET, height, ROAD_LINE_SPACING):
+        pygame.draw.rect(surface, WHITE, (20 + ROAD_WIDTH // 2 - 5, y, 10, 20))
+    return surface
+
+def get_road_surface():
+    return scene_cache.get(create_road_surface)
+
+# Освещение ночью и на закате: слой темноты заливается цветом окружения,
+# на него аддитивно кладутся заранее рассчитанные радиальные маски света,
+# и слой одним BLEND_MULT умножается на кадр. Пятна фонарей запечены в
+# бесшовную полосу вместе с темнотой, поэтому цена кадра не зависит от
+# числа источников: два blit полосы, фары и одно умножение
+LIGHT_AMBIENT = {"night": (55, 55, 90), "sunset": (235, 185, 165)}
+LAMP_SPACING = ROAD_LINE_SPACING * 4
+LAMP_OFFSET = 30
+LAMP_RADIUS = 110
+LAMP_COLOR = (255, 210, 140)
+HEADLIGHT_RADIUS = 90
+HEADLIGHT_COLOR = (255, 255, 220)
+
+def create_light_mask(radius, color):
+    # Квадратичное затухание от центра к краю, посчитанное одним проходом NumPy
+    d = np.arange(radius * 2) - radius + 0.5
+    distance = np.sqrt(d[:, None] ** 2 + d[None, :] ** 2) / radius
+    falloff = np.clip(1.0 - distance, 0.0, 1.0) ** 2
+    pixels = (falloff[:, :, None] * np.array(color, dtype=float)).astype(np.uint8)
+    return pygame.surfarray.make_surface(pixels)
+
+def get_light_mask(radius, color):
+    return scene_cache.get(create_light_mask, radius, tuple(color))
+
+def create_light_tile(time_of_day):
+    # Темнота с пятнами фонарей по обе стороны дороги; высота кратна шагу фонарей
+    height = -(-SCREEN_HEIGHT // LAMP_SPACING) * LAMP_SPACING
+    surface = pygame.Surface((SCREEN_WIDTH, height))
+    surface.fill(LIGHT_AMBIENT[time_of_day])
+    mask = get_light_mask(LAMP_RADIUS, LAMP_COLOR)
+    road_left = (SCREEN_WIDTH - ROAD_WIDTH) // 2
+    for x in (road_left - 10, road_left + ROAD_WIDTH + 10):
+        for y in range(LAMP_OFFSET, height, LAMP_SPACING):
+            # Пятна у краёв полосы дублируются со сдвигом на высоту, чтобы стык был незаметен
+            for shift in (-height, 0, height):
+                surface.blit(mask, (x - LAMP_RADIUS, y + shift - LAMP_RADIUS), special_flags=pygame.BLEND_ADD)
     return surface
 
+def get_light_tile(time_of_day):
+    return scene_cache.get(create_light_tile, time_of_day)
+
+def create_lamp_surface():
+    surface = pygame.Surface((20, 12), pygame.SRCALPHA)
+    # Столб и плафон, вид сверху
+    pygame.draw.circle(surface, DARK_GRAY, (4, 6), 4)
+    pygame.draw.line(surface, DARK_GRAY, (4, 6), (14, 6), 2)
+    pygame.draw.ellipse(surface, LIGHT_YELLOW, (10, 2, 10, 8))
+    return surface
+
+def get_lamp_surface(flipped=False):
+    lamp = scene_cache.get(create_lamp_surface)
+    return scene_cache.get(pygame.transform.flip, lamp, True, False) if flipped else lamp
+
+# Профилировщик кадра: время каждой фазы складывается в кольцевой буфер,
+# по нему рисуется оверлей (F3) и при выходе пишется трасса в CSV/JSON
+PROFILE_PHASES = ["input", "spawn", "update", "collision", "sky", "road", "decorations", "entities", "lighting",
+                  "hud", "capture", "present"]
+PROFILE_COLORS = [WHITE, ORANGE, YELLOW, RED, LIGHT_BLUE, GRAY, GREEN, PURPLE, LIGHT_YELLOW, SILVER, DARK_GREEN, BLUE]
+
+class FrameProfiler:
+    def __init__(self, capacity=600):
+        self.enabled = False
+        self.overlay = False
+        self.capacity = capacity
+        self.phase_index = {name: i for i, name in enumerate(PROFILE_PHASES)}
+        self.phases = np.zeros((capacity, len(PROFILE_PHASES)))
+        self.frames = np.zeros(capacity)
+        self.current = [0.0] * len(PROFILE_PHASES)
+        self.index = 0
+        self.count = 0
+        self.total = 0
+        self.frame_start = 0.0
+        self.last = 0.0
+        self.summary = None
+        self.summary_frame = 0
+    
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame_start = self.last = time.perf_counter()
+        self.current = [0.0] * len(PROFILE_PHASES)
+    
+    def mark(self, phase):
+        # Время с предыдущей отметки относится к фазе phase
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current[self.phase_index[phase]] += now - self.last
+        self.last = now
+    
+    def end_frame(self):
+        if not self.enabled:
+            return
+        i = self.index
+        self.phases[i] = self.current
+        self.frames[i] = time.perf_counter() - self.frame_start
+        self.index = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.total += 1
+    
+    def ordered(self):
+        # Записи буфера от старых к новым
+        if self.count < self.capacity:
+            return self.frames[:self.count], self.phases[:self.count]
+        order = np.r_[self.index:self.capacity, 0:self.index]
+        return self.frames[order], self.phases[order]
+    
+    def stats(self):
+        frames, phases = self.ordered()
+        if not len(frames):
+            return None
+        p50, p95, p99 = np.percentile(frames, [50, 95, 99]) * 1000
+        return {
+            "frames": len(frames),
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+            "phases_ms": dict(zip(PROFILE_PHASES, (phases.mean(axis=0) * 1000).tolist()))
+        }
+    
+    def draw_overlay(self, fps):
+        # Перцентили пересчитываются раз в 30 кадров, чтобы не плодить текстуры в кэше текста
+        if self.summary is None or self.total - self.summary_frame >= 30:
+            self.summary = self.stats()
+            self.summary_frame = self.total
+        stats = self.summary
+        if stats is None:
+            return pygame.Rect(0, 0, 0, 0)
+        
+        rect = pygame.Rect(SCREEN_WIDTH - 230, 10, 220, 60 + 18 * len(PROFILE_PHASES))
+        screen.fill(DARK_GRAY, rect)
+        draw_text(f"FPS: {fps:.0f}   качество {governor.tier}/{governor.max_tier} {governor.settings['name']}",
+                  22, WHITE, (rect.x + 8, rect.y + 6))
+        draw_text(f"p50 {stats['p50_ms']:.1f}  p95 {stats['p95_ms']:.1f}  p99 {stats['p99_ms']:.1f} ms",
+                  22, WHITE, (rect.x + 8, rect.y + 26))
+        
+        scale = 120 / max(stats["p95_ms"], 1.0)
+        y = rect.y + 50
+        for name, color in zip(PROFILE_PHASES, PROFILE_COLORS):
+            ms = stats["phases_ms"][name]
+            draw_text(name, 18, WHITE, (rect.x + 8, y))
+            screen.fill(color, (rect.x + 90, y + 2, max(1, int(ms * scale)), 10))
+            y += 18
+        return rect
+    
+    def dump(self, path):
+        frames, phases = self.ordered()
+        if path.endswith(".json"):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "phases": PROFILE_PHASES,
+                    "summary": self.stats(),
+                    "frames": [
+                        {"frame_ms": frame * 1000, **dict(zip(PROFILE_PHASES, (row * 1000).tolist()))}
+                        for frame, row in zip(frames.tolist(), phases)
+                    ]
+                }, f, indent=1)
+        else:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame", "frame_ms"] + PROFILE_PHASES)
+                for i, (frame, row) in enumerate(zip(frames.tolist(), phases)):
+                    writer.writerow([i, f"{frame * 1000:.3f}"] + [f"{ms:.3f}" for ms in (row * 1000).tolist()])
+
+profiler = FrameProfiler()
+
+# Уровни качества: от полного к самому дешёвому, каждый следующий отключает
+# ещё одну статью расходов кадра. Симуляцию уровни не трогают — меняется
+# только то, что и как рисуется, поэтому записи партий воспроизводятся при любом
+QUALITY_TIERS = [
+    {"name": "full", "stars": 1.0, "decoration_step": 1, "highlight": True, "antialias": True, "lights": True,
+     "scale": 1.0},
+    {"name": "stars", "stars": 0.25, "decoration_step": 1, "highlight": True, "antialias": True, "lights": True,
+     "scale": 1.0},
+    {"name": "scenery", "stars": 0.0, "decoration_step": 2, "highlight": True, "antialias": True, "lights": True,
+     "scale": 1.0},
+    {"name": "flat", "stars": 0.0, "decoration_step": 2, "highlight": False, "antialias": True, "lights": True,
+     "scale": 1.0},
+    {"name": "aliased", "stars": 0.0, "decoration_step": 2, "highlight": False, "antialias": False, "lights": True,
+     "scale": 1.0},
+    {"name": "unlit", "stars": 0.0, "decoration_step": 2, "highlight": False, "antialias": False, "lights": False,
+     "scale": 1.0},
+    {"name": "lowres", "stars": 0.0, "decoration_step": 2, "highlight": False, "antialias": False, "lights": False,
+     "scale": 0.75}
+]
+
+# Регулятор качества: скользящее среднее времени кадра сравнивается с бюджетом.
+# Гистерезис: понижаем при превышении на degrade_at не раньше cooldown кадров
+# после смены уровня, повышаем только при запасе upgrade_at и не раньше
+# upgrade_delay кадров. Если повышение тут же пришлось откатить, следующая
+# попытка откладывается вдвое дольше
+class QualityGovernor:
+    def __init__(self, window=60, degrade_at=1.15, upgrade_at=0.7, cooldown=120):
+        self.enabled = False
+        self.tier = 0
+        self.max_tier = len(QUALITY_TIERS) - 1
+        self.settings = QUALITY_TIERS[0]
+        self.budget = 1 / 60
+        self.samples = deque(maxlen=window)
+        self.degrade_at = degrade_at
+        self.upgrade_at = upgrade_at
+        self.cooldown = cooldown
+        self.upgrade_delay = cooldown * 2
+        self.since_change = 0
+        self.last_change = 0
+        self.changes = 0
+        self.logical = None
+        self.scaled = OrderedDict()
+    
+    def set_budget(self, fps):
+        # Без ограничения FPS ориентируемся на частоту тиков симуляции
+        self.budget = 1 / (fps or 60)
+    
+    def set_tier(self, tier):
+        tier = max(0, min(tier, self.max_tier))
+        if tier != self.tier:
+            self.last_change = tier - self.tier
+            self.since_change = 0
+            self.tier = tier
+            self.settings = QUALITY_TIERS[tier]
+            self.changes += 1
+            self.scaled.clear()
+        self.samples.clear()
+    
+    def record(self, frame_time):
+        # frame_time — работа кадра без ожидания в clock.tick
+        if not self.enabled:
+            return
+        self.samples.append(frame_time)
+        self.since_change += 1
+        if len(self.samples) < self.samples.maxlen or self.since_change < self.cooldown:
+            return
+        
+        average = sum(self.samples) / len(self.samples)
+        if average > self.budget * self.degrade_at and self.tier < self.max_tier:
+            if self.last_change < 0 and self.since_change < self.upgrade_delay:
+                self.upgrade_delay = min(self.upgrade_delay * 2, self.cooldown * 30)
+            self.set_tier(self.tier + 1)
+        elif (average < self.budget * self.upgrade_at and self.tier > 0
+              and self.since_change >= self.upgrade_delay):
+            self.set_tier(self.tier - 1)
+    
+    def scaled_surface(self, surface, scale):
+        # Уменьшенные копии спрайтов и надписей для отрисовки в низком разрешении
+        key = (surface, scale)
+        image = self.scaled.get(key)
+        if image is None:
+            width, height = surface.get_size()
+            image = pygame.transform.scale(surface, (max(1, round(width * scale)), max(1, round(height * scale))))
+            self.scaled[key] = image
+            if len(self.scaled) > 256:
+                self.scaled.popitem(last=False)
+        else:
+            self.scaled.move_to_end(key)
+        return image
+    
+    def draw_scaled(self, draw):
+        # Кадр рисуется на уменьшенную поверхность и растягивается на экран одним scale
+        scale = self.settings["scale"]
+        size = (round(SCREEN_WIDTH * scale), round(SCREEN_HEIGHT * scale))
+        if self.logical is None or self.logical.get_size() != size:
+            self.logical = pygame.Surface(size).convert()
+        draw_to(self.logical, scale, draw)
+        pygame.transform.scale(self.logical, screen.get_size(), screen)
+
+governor = QualityGovernor()
+render_scale = 1.0
+
+def draw_to(surface, scale, draw):
+    # Временно подменяет экран: всё, что рисует draw(), попадает на surface в масштабе scale
+    global screen, render_scale
+    display = screen
+    screen, render_scale = surface, scale
+    try:
+        draw()
+    finally:
+        screen, render_scale = display, 1.0
+
+def blit(surface, pos):
+    # Вывод спрайта сцены в экранных координатах с учётом текущего масштаба
+    if render_scale == 1.0:
+        screen.blit(surface, pos)
+    else:
+        screen.blit(governor.scaled_surface(surface, render_scale), (pos[0] * render_scale, pos[1] * render_scale))
+
 # Класс машины
 class Car:
     def __init__(self, car_type="mercedes", color=None):
@@ -298,8 +1129,9 @@ class Car:
                 self.color = YELLOW
             elif car_type == "zhiguli":
                 self.color = RED
-                
-        self.surface = create_car_surface(self.color, self.type)
+        
+        # Положение на прошлом тике — для интерполяции при отрисовке
+        self.prev_x = self.x
     
     def move(self, direction):
         if direction == "left" and self.x > (SCREEN_WIDTH - ROAD_WIDTH) // 2:
@@ -307,103 +1139,496 @@ class Car:
         if direction == "right" and self.x < (SCREEN_WIDTH + ROAD_WIDTH) // 2 - CAR_WIDTH:
             self.x += self.speed
     
-    def draw(self):
-        screen.blit(self.surface, (self.x, self.y))
+    def get_surface(self):
+        return get_car_surface(self.color, self.type)
+    
+    def get_mask(self):
+        return get_car_mask(self.type)
+    
+    def render_pos(self, alpha=1.0):
+        return self.prev_x + (self.x - self.prev_x) * alpha, self.y
+    
+    def draw(self, alpha=1.0):
+        blit(self.get_surface(), self.render_pos(alpha))
     
     def increase_speed(self):
         if self.speed < MAX_SPEED:
             self.speed += SPEED_INCREMENT
 
+# Виды сущностей в хранилище
+KIND_PERSON = 0
+KIND_BOX = 1
+KIND_DECORATION = 2
+
+# Хранилище сущностей: координаты и размеры лежат в непрерывных массивах NumPy,
+# поэтому движение, отсечение и столкновения считаются одним проходом
+class EntityStore:
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.prev_y = np.zeros(0)
+        self.speed = np.zeros(0)
+        self.width = np.zeros(0)
+        self.height = np.zeros(0)
+        self.kind = np.zeros(0, dtype=np.int8)
+        # alive — участвует в столкновениях, occupied — слот занят сущностью
+        # (сбитый человек уже не alive, но ещё едет до уборки)
+        self.alive = np.zeros(0, dtype=bool)
+        self.occupied = np.zeros(0, dtype=bool)
+        self.objects = []
+        self.free_slots = []
+        self.grow(capacity)
+    
+    def grow(self, capacity):
+        extra = capacity - self.capacity
+        self.x = np.concatenate([self.x, np.zeros(extra)])
+        self.y = np.concatenate([self.y, np.zeros(extra)])
+        self.prev_y = np.concatenate([self.prev_y, np.zeros(extra)])
+        self.speed = np.concatenate([self.speed, np.zeros(extra)])
+        self.width = np.concatenate([self.width, np.zeros(extra)])
+        self.height = np.concatenate([self.height, np.zeros(extra)])
+        self.kind = np.concatenate([self.kind, np.zeros(extra, dtype=np.int8)])
+        self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+        self.occupied = np.concatenate([self.occupied, np.zeros(extra, dtype=bool)])
+        self.objects.extend([None] * extra)
+        # Свободные слоты выдаются с начала массива
+        self.free_slots = list(range(capacity - 1, self.capacity - 1, -1)) + self.free_slots
+        self.capacity = capacity
+    
+    def add(self, obj, kind, x, y, speed, width, height):
+        if not self.free_slots:
+            self.grow(self.capacity * 2)
+        slot = self.free_slots.pop()
+        self.x[slot] = x
+        self.y[slot] = y
+        self.prev_y[slot] = y
+        self.speed[slot] = speed
+        self.width[slot] = width
+        self.height[slot] = height
+        self.kind[slot] = kind
+        self.alive[slot] = True
+        self.occupied[slot] = True
+        self.objects[slot] = obj
+        return slot
+    
+    def remove(self, slot):
+        self.alive[slot] = False
+        self.occupied[slot] = False
+        # Свободный слот стоит на месте: движение идёт без маски alive
+        self.speed[slot] = 0.0
+        self.objects[slot] = None
+        self.free_slots.append(slot)
+    
+    def __len__(self):
+        return self.capacity - len(self.free_slots)
+    
+    def update(self):
+        # Прошлые координаты нужны для интерполяции кадра между тиками
+        # При малом числе сущностей цена тика — число вызовов NumPy, а не размер
+        # массивов, поэтому движение — два вызова без промежуточных масок
+        np.copyto(self.prev_y, self.y)
+        self.y += self.speed
+    
+    def collide(self, x, y, width, height, kind=None):
+        # AABB-проверка всех сущностей (или одного вида) с прямоугольником
+        hit = (self.alive &
+               (self.x < x + width) & (self.x + self.width > x) &
+               (self.y < y + height) & (self.y + self.height > y))
+        if kind is not None:
+            hit &= self.kind == kind
+        return np.flatnonzero(hit)
+
+# Сетка для широкой фазы столкновений сущностей между собой. Ячейки —
+# столбцы шириной cell_size по левому краю сущности, а внутри столбца
+# сущности отсортированы по верхнему краю: по y ячейка сколь угодно мелкая.
+# Для каждой сущности ищутся окна в тех столбцах, которые может задеть её
+# прямоугольник, двумя searchsorted по общему ключу «столбец, y», и точная
+# проверка идёт только для пар из этих окон. Сортировка идёт при каждом
+# запросе — сущности всё время едут. Пока пар мало, перебор всех пар
+# дешевле сортировки: до PAIRS_SCAN_LIMIT — циклом Python (обычная партия,
+# где на дороге по несколько людей и коробок), до brute_force_limit — одним
+# проходом NumPy. Прямоугольник против всех сущностей (машина) быстрее
+# одним проходом по хранилищу — см. EntityStore.collide
+PAIRS_SCAN_LIMIT = 64
+PAIRS_BRUTE_FORCE_LIMIT = 16384
+
+def run_offsets(counts):
+    # Номера внутри подряд идущих отрезков длины counts: 0..c0-1, 0..c1-1, ...
+    return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+class SpatialGrid:
+    def __init__(self, store, cell_size=40, brute_force_limit=PAIRS_BRUTE_FORCE_LIMIT):
+        self.store = store
+        self.cell_size = cell_size
+        self.scale = 1 / cell_size
+        self.brute_force_limit = brute_force_limit
+        # Слоты в сетке по видам
+        self.members = defaultdict(set)
+        # Счётчики последнего запроса
+        self.all_pairs = 0
+        self.candidate_pairs = 0
+        self.overlaps = 0
+    
+    def insert(self, slot):
+        self.members[int(self.store.kind[slot])].add(slot)
+    
+    def remove(self, slot):
+        self.members[int(self.store.kind[slot])].discard(slot)
+    
+    def slots(self, kind):
+        if kind is None:
+            return set().union(*self.members.values())
+        return self.members[kind]
+    
+    def scan(self, in_a, in_b, shared):
+        # Перебор пар циклом Python: на паре людей и коробок он в разы дешевле
+        # любого прохода NumPy. item() отдаёт float без скаляра NumPy
+        store = self.store
+        x, y, w, h = store.x.item, store.y.item, store.width.item, store.height.item
+        alive = store.alive.item
+        a = [(slot, x(slot), y(slot), x(slot) + w(slot), y(slot) + h(slot)) for slot in in_a if alive(slot)]
+        b = [(slot, x(slot), y(slot), x(slot) + w(slot), y(slot) + h(slot)) for slot in in_b if alive(slot)]
+        first = []
+        second = []
+        tests = 0
+        for i, left, top, right, bottom in a:
+            for j, left_j, top_j, right_j, bottom_j in b:
+                if shared and (i == j or (i > j and i in in_b and j in in_a)):
+                    continue
+                tests += 1
+                if left < right_j and right > left_j and top < bottom_j and bottom > top_j:
+                    first.append(i)
+                    second.append(j)
+        self.all_pairs = len(a) * len(b)
+        self.candidate_pairs = tests
+        self.overlaps = len(first)
+        return np.array(first, dtype=np.intp), np.array(second, dtype=np.intp)
+    
+    def candidates(self, a, b):
+        # Пары (a, b) из окон: столбцы b, которые может задеть a, и в каждом —
+        # отрезок b с верхним краем в (y_a - max h_b, y_a + h_a)
+        store = self.store
+        xa, ya, wa, ha = store.x[a], store.y[a], store.width[a], store.height[a]
+        xb, yb = store.x[b], store.y[b]
+        reach_x = store.width[b].max()
+        reach_y = store.height[b].max()
+        left = min(xa.min(), xb.min())
+        top = min(ya.min(), yb.min())
+        # Столбцы в ключе разнесены дальше, чем достаёт любое окно по y
+        span = max(ya.max(), yb.max()) - top + max(reach_y, ha.max()) + 1
+        key = np.floor((xb - left) * self.scale) * span + (yb - top)
+        order = np.argsort(key)
+        key = key[order]
+        b = b[order]
+        first_column = np.floor((xa - reach_x - left) * self.scale)
+        columns = (np.floor((xa + wa - left) * self.scale) - first_column).astype(np.intp) + 1
+        query = np.repeat(np.arange(len(a)), columns)
+        base = (np.repeat(first_column, columns) + run_offsets(columns)) * span + (ya[query] - top)
+        start = np.searchsorted(key, base - reach_y, side="right")
+        stop = np.searchsorted(key, base + ha[query], side="left")
+        counts = stop - start
+        return np.repeat(a[query], counts), b[np.repeat(start, counts) + run_offsets(counts)]
+    
+    def pairs(self, kind_a=None, kind_b=None):
+        # Пересекающиеся сущности (например, коробка и человек) двумя
+        # массивами слотов: first вида kind_a, second вида kind_b, None — любой вид.
+        # Пара, которую видно с обеих сторон, возвращается один раз
+        a, b = self.slots(kind_a), self.slots(kind_b)
+        shared = kind_a is None or kind_b is None or kind_a == kind_b
+        if len(a) * len(b) <= PAIRS_SCAN_LIMIT:
+            return self.scan(a, b, shared)
+        store = self.store
+        alive = store.alive
+        a = np.fromiter(a, np.intp, len(a))
+        b = np.fromiter(b, np.intp, len(b))
+        a, b = a[alive[a]], b[alive[b]]
+        self.all_pairs = len(a) * len(b)
+        x, y, w, h = store.x, store.y, store.width, store.height
+        if self.all_pairs <= self.brute_force_limit:
+            # Все пары сразу: матрица len(a) x len(b) без промежуточных индексов
+            xa, ya = x[a][:, None], y[a][:, None]
+            hit = ((xa < x[b] + w[b]) & (xa + w[a][:, None] > x[b]) &
+                   (ya < y[b] + h[b]) & (ya + h[a][:, None] > y[b]))
+            i, j = np.nonzero(hit)
+            first, second = a[i], b[j]
+            self.candidate_pairs = self.all_pairs
+        else:
+            first, second = self.candidates(a, b)
+            self.candidate_pairs = len(first)
+            hit = ((x[first] < x[second] + w[second]) & (x[first] + w[first] > x[second]) &
+                   (y[first] < y[second] + h[second]) & (y[first] + h[first] > y[second]))
+            first, second = first[hit], second[hit]
+        if shared:
+            # Сущность не пересекается сама с собой, а пару из общих для a и b
+            # слотов оставляем один раз
+            in_a = np.zeros(store.capacity, dtype=bool)
+            in_b = np.zeros(store.capacity, dtype=bool)
+            in_a[a] = True
+            in_b[b] = True
+            mirrored = in_b[first] & in_a[second]
+            keep = (first != second) & (~mirrored | (first < second))
+            first, second = first[keep], second[keep]
+        self.overlaps = len(first)
+        return first, second
+    
+    def stats(self):
+        return {
+            "tracked": sum(len(slots) for slots in self.members.values()),
+            "all_pairs": self.all_pairs,
+            "candidate_pairs": self.candidate_pairs,
+            "overlaps": self.overlaps
+        }
+
+# Базовый класс сущности: данные хранятся в EntityStore, объект — лишь ссылка на слот
+class Entity:
+    __slots__ = ("store", "slot")
+    
+    def spawn(self, store, kind, x, y, speed, width, height):
+        self.store = store
+        self.slot = store.add(self, kind, x, y, speed, width, height)
+    
+    @property
+    def x(self):
+        return float(self.store.x[self.slot])
+    
+    @x.setter
+    def x(self, value):
+        self.store.x[self.slot] = value
+    
+    @property
+    def y(self):
+        return float(self.store.y[self.slot])
+    
+    @y.setter
+    def y(self, value):
+        # Перенос, а не движение: интерполировать нечего
+        self.store.y[self.slot] = value
+        self.store.prev_y[self.slot] = value
+    
+    def render_pos(self, alpha=1.0):
+        store = self.store
+        slot = self.slot
+        prev = store.prev_y[slot]
+        return float(store.x[slot]), float(prev + (store.y[slot] - prev) * alpha)
+    
+    @property
+    def speed(self):
+        return float(self.store.speed[self.slot])
+    
+    @property
+    def width(self):
+        return float(self.store.width[self.slot])
+    
+    @property
+    def height(self):
+        return float(self.store.height[self.slot])
+
 # Класс человека
-class Person:
-    def __init__(self):
+class Person(Entity):
+    __slots__ = ("hit",)
+    
+    def __init__(self, store):
+        self.reset(store)
+    
+    def reset(self, store):
         road_left = (SCREEN_WIDTH - ROAD_WIDTH) // 2
-        self.x = random.randint(road_left, road_left + ROAD_WIDTH - PERSON_WIDTH)
-        self.y = -PERSON_HEIGHT
-        self.speed = random.randint(2, 5)
-        self.surface = create_person_surface()
+        x = random.randint(road_left, road_left + ROAD_WIDTH - PERSON_WIDTH)
+        speed = random.randint(*PERSON_SPEED_RANGE)
+        self.spawn(store, KIND_PERSON, x, -PERSON_HEIGHT, speed, PERSON_WIDTH, PERSON_HEIGHT)
         self.hit = False
     
-    def update(self):
-        self.y += self.speed
+    def get_surface(self):
+        return get_person_surface()
     
-    def draw(self):
+    def draw(self, alpha=1.0):
         if not self.hit:
-            screen.blit(self.surface, (self.x, self.y))
-    
-    def check_collision(self, car):
-        if (not self.hit and 
-            self.x < car.x + CAR_WIDTH and 
-            self.x + PERSON_WIDTH > car.x and 
-            self.y < car.y + CAR_HEIGHT and 
-            self.y + PERSON_HEIGHT > car.y):
-            self.hit = True
-            return True
-        return False
+            blit(self.get_surface(), self.render_pos(alpha))
+    
+    def on_hit(self):
+        # Сбитый человек больше не участвует в пакетных проходах
+        self.hit = True
+        self.store.alive[self.slot] = False
 
 # Класс коробки (препятствие)
-class Box:
-    def __init__(self):
-        road_left = (SCREEN_WIDTH - ROAD_WIDTH) // 2
-        self.x = random.randint(road_left, road_left + ROAD_WIDTH - BOX_WIDTH)
-        self.y = -BOX_HEIGHT
-        self.speed = random.randint(3, 6)
-        self.surface = create_box_surface()
+class Box(Entity):
+    __slots__ = ()
     
-    def update(self):
-        self.y += self.speed
+    def __init__(self, store):
+        self.reset(store)
     
-    def draw(self):
-        screen.blit(self.surface, (self.x, self.y))
+    def reset(self, store):
+        road_left = (SCREEN_WIDTH - ROAD_WIDTH) // 2
+        x = random.randint(road_left, road_left + ROAD_WIDTH - BOX_WIDTH)
+        speed = random.randint(*BOX_SPEED_RANGE)
+        self.spawn(store, KIND_BOX, x, -BOX_HEIGHT, speed, BOX_WIDTH, BOX_HEIGHT)
     
-    def check_collision(self, car):
-        if (self.x < car.x + CAR_WIDTH and 
-            self.x + BOX_WIDTH > car.x and 
-            self.y < car.y + CAR_HEIGHT and 
-            self.y + BOX_HEIGHT > car.y):
-            return True
-        return False
+    def get_surface(self):
+        return get_box_surface()
     
-    def is_off_screen(self):
-        return self.y > SCREEN_HEIGHT
+    def draw(self, alpha=1.0):
+        blit(self.get_surface(), self.render_pos(alpha))
 
 # Класс декораций (деревья, дома)
-class Decoration:
-    def __init__(self, type_name, side):
+class Decoration(Entity):
+    __slots__ = ("type", "side", "variant", "surface")
+    
+    def __init__(self, store, type_name, side):
+        self.reset(store, type_name, side)
+    
+    def reset(self, store, type_name, side):
         self.type = type_name
         self.side = side  # "left" или "right"
         
+        # Внешний вид рисуется лениво при первой отрисовке
+        self.variant = random.getrandbits(32)
+        self.surface = None
+        
         if self.type == "tree":
-            self.surface = create_tree_surface()
-            self.width = 60
-            self.height = 100
+            width, height = 60, 100
         elif self.type == "house":
-            self.surface = create_house_surface()
-            self.width = 80
-            self.height = 80
+            width, height = 80, 80
         elif self.type == "rocket":
-            self.surface = create_rocket_surface()
-            self.width = 40
-            self.height = 80
+            width, height = 40, 80
             
         road_left = (SCREEN_WIDTH - ROAD_WIDTH) // 2
         
         if self.side == "left":
-            self.x = random.randint(10, road_left - self.width - 10)
+            x = random.randint(10, road_left - width - 10)
         else:
-            self.x = random.randint(road_left + ROAD_WIDTH + 10, SCREEN_WIDTH - self.width - 10)
+            x = random.randint(road_left + ROAD_WIDTH + 10, SCREEN_WIDTH - width - 10)
             
-        self.y = -self.height
-        self.speed = random.randint(1, 3)
+        speed = random.randint(1, 3)
+        self.spawn(store, KIND_DECORATION, x, -height, speed, width, height)
     
-    def update(self):
-        self.y += self.speed
+    def get_surface(self):
+        if self.surface is None:
+            self.surface = get_decoration_surface(self.type, self.variant)
+        return self.surface
     
-    def draw(self):
-        screen.blit(self.surface, (self.x, self.y))
+    def draw(self, alpha=1.0):
+        blit(self.get_surface(), self.render_pos(alpha))
+
+# Пул объектов: убранные с дороги сущности сбрасываются и переиспользуются,
+# а не создаются заново
+class EntityPool:
+    def __init__(self, cls):
+        self.cls = cls
+        self.free = []
+        self.created = 0
+        self.reused = 0
+        self.live = 0
+        self.high_water = 0
+    
+    def acquire(self, *args):
+        if self.free:
+            entity = self.free.pop()
+            entity.reset(*args)
+            self.reused += 1
+        else:
+            entity = self.cls(*args)
+            self.created += 1
+        self.live += 1
+        if self.live > self.high_water:
+            self.high_water = self.live
+        return entity
     
-    def is_off_screen(self):
-        return self.y > SCREEN_HEIGHT
+    def release(self, entity):
+        self.live -= 1
+        self.free.append(entity)
+    
+    def stats(self):
+        total = self.created + self.reused
+        return {
+            "live": self.live,
+            "free": len(self.free),
+            "high_water": self.high_water,
+            "created": self.created,
+            "reused": self.reused,
+            "reuse_rate": self.reused / total if total else 0.0
+        }
+
+# Жизненный цикл сущностей: появление, уборка сбитых и уехавших за экран,
+# уплотнение списков и ограничения по видам. Стоимость кадра зависит от того,
+# что на экране, а не от длительности сессии
+class EntityLifecycle:
+    def __init__(self):
+        self.store = EntityStore()
+        self.grid = SpatialGrid(self.store)
+        self.pools = {
+            KIND_PERSON: EntityPool(Person),
+            KIND_BOX: EntityPool(Box),
+            KIND_DECORATION: EntityPool(Decoration)
+        }
+        self.lists = {KIND_PERSON: [], KIND_BOX: [], KIND_DECORATION: []}
+        self.caps = {KIND_PERSON: MAX_PEOPLE, KIND_BOX: MAX_BOXES, KIND_DECORATION: MAX_DECORATIONS}
+        self.retired = {KIND_PERSON: 0, KIND_BOX: 0, KIND_DECORATION: 0}
+        self.rejected = {KIND_PERSON: 0, KIND_BOX: 0, KIND_DECORATION: 0}
+        self.pending = set()
+    
+    def spawn(self, kind, *args):
+        entities = self.lists[kind]
+        if len(entities) >= self.caps[kind]:
+            self.rejected[kind] += 1
+            return None
+        entity = self.pools[kind].acquire(self.store, *args)
+        entities.append(entity)
+        # Декорации стоят у обочины и в столкновениях не участвуют
+        if kind != KIND_DECORATION:
+            self.grid.insert(entity.slot)
+        return entity
+    
+    def retire(self, slot):
+        self.pending.add(int(slot))
+    
+    def retire_off_screen(self):
+        # По занятым слотам, а не по alive: сущность, выбывшую из столкновений
+        # вне Game.update, тоже надо убрать, когда она уедет за экран
+        store = self.store
+        off_screen = np.flatnonzero(store.occupied & (store.y > SCREEN_HEIGHT))
+        self.pending.update(off_screen.tolist())
+    
+    def compact(self):
+        # Убираем помеченные сущности из списков, сетки и хранилища
+        if not self.pending:
+            return
+        pending = self.pending
+        store = self.store
+        for kind, entities in self.lists.items():
+            if not any(entity.slot in pending for entity in entities):
+                continue
+            pool = self.pools[kind]
+            kept = []
+            for entity in entities:
+                if entity.slot in pending:
+                    pool.release(entity)
+                    self.retired[kind] += 1
+                else:
+                    kept.append(entity)
+            entities[:] = kept
+        for slot in pending:
+            self.grid.remove(slot)
+            store.remove(slot)
+        pending.clear()
+    
+    def pool_stats(self):
+        return {
+            "person": self.pools[KIND_PERSON].stats(),
+            "box": self.pools[KIND_BOX].stats(),
+            "decoration": self.pools[KIND_DECORATION].stats()
+        }
+    
+    def stats(self):
+        names = {KIND_PERSON: "person", KIND_BOX: "box", KIND_DECORATION: "decoration"}
+        return {
+            names[kind]: {
+                "live": len(entities),
+                "retired": self.retired[kind],
+                "rejected": self.rejected[kind],
+                "cap": self.caps[kind]
+            }
+            for kind, entities in self.lists.items()
+        }
 
 # Класс выбора машины
 class CarSelection:
@@ -415,24 +1640,24 @@ class CarSelection:
             {"type": "zhiguli", "name": "Жигули", "default_color": RED}
         ]
         self.selected_index = 0
-        self.car_surfaces = []
-        self.color_options = [RED, BLUE, GREEN, YELLOW, PURPLE, SILVER, BLACK, ORANGE]
+        # Машины дорисовываются в свободное время кадров, см. AssetWarmup
+        self.car_surfaces = [None] * len(self.cars)
+        self.color_options = CAR_COLORS
         self.selected_color_index = 0
         self.time_of_day_options = ["day", "night", "sunset"]
         self.selected_time_index = 0
-        
-        # Создаем поверхности для всех машин с цветами по умолчанию
-        for car in self.cars:
-            self.car_surfaces.append(create_car_surface(car["default_color"], car["type"]))
+
+    def bake_car(self, index):
+        if self.car_surfaces[index] is None:
+            car = self.cars[index]
+            self.car_surfaces[index] = get_car_surface(car["default_color"], car["type"])
     
     def draw(self):
         # Фон
         screen.fill(LIGHT_BLUE)
         
         # Заголовок
-        font = pygame.font.SysFont(None, 72)
-        title = font.render("Выберите машину", True, BLACK)
-        screen.blit(title, (SCREEN_WIDTH//2 - title.get_width()//2, 30))
+        draw_text("Выберите машину", 72, BLACK, (SCREEN_WIDTH//2, 30), center=True)
         
         # Рисуем все машины
         spacing = SCREEN_WIDTH // (len(self.cars) + 1)
@@ -444,17 +1669,17 @@ class CarSelection:
             if i == self.selected_index:
                 pygame.draw.rect(screen, GREEN, (x-10, y-10, CAR_WIDTH+20, CAR_HEIGHT+20), 3)
             
-            screen.blit(car_surface, (x, y))
+            if car_surface is not None:
+                screen.blit(car_surface, (x, y))
+            else:
+                # Заглушка, пока машина ещё не нарисована
+                pygame.draw.rect(screen, GRAY, (x, y, CAR_WIDTH, CAR_HEIGHT), 2, border_radius=8)
             
             # Название машины
-            font = pygame.font.SysFont(None, 36)
-            name_text = font.render(self.cars[i]["name"], True, BLACK)
-            screen.blit(name_text, (x + CAR_WIDTH//2 - name_text.get_width()//2, y + CAR_HEIGHT + 20))
+            draw_text(self.cars[i]["name"], 36, BLACK, (x + CAR_WIDTH//2, y + CAR_HEIGHT + 20), center=True)
         
         # Рисуем выбор цвета
-        font = pygame.font.SysFont(None, 36)
-        color_text = font.render("Выберите цвет:", True, BLACK)
-        screen.blit(color_text, (SCREEN_WIDTH//2 - color_text.get_width()//2, SCREEN_HEIGHT//2 + 80))
+        draw_text("Выберите цвет:", 36, BLACK, (SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 80), center=True)
         
         color_spacing = 40
         for i, color in enumerate(self.color_options):
@@ -465,30 +1690,22 @@ class CarSelection:
                 pygame.draw.rect(screen, WHITE, (x-2, y-2, 34, 34), 2)
         
         # Рисуем выбор времени суток
-        time_text = font.render("Время суток:", True, BLACK)
-        screen.blit(time_text, (SCREEN_WIDTH//2 - time_text.get_width()//2, SCREEN_HEIGHT//2 + 160))
+        draw_text("Время суток:", 36, BLACK, (SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 160), center=True)
         
         time_options = ["День", "Ночь", "Закат"]
         for i, option in enumerate(time_options):
             x = SCREEN_WIDTH//2 - (len(time_options) * 100)//2 + i * 100
             y = SCREEN_HEIGHT//2 + 200
             color = BLACK if i != self.selected_time_index else GREEN
-            option_text = font.render(option, True, color)
-            screen.blit(option_text, (x, y))
+            option_text = draw_text(option, 36, color, (x, y))
             if i == self.selected_time_index:
                 pygame.draw.rect(screen, GREEN, (x-5, y-5, option_text.get_width()+10, option_text.get_height()+10), 2)
         
         # Инструкция
-        font = pygame.font.SysFont(None, 30)
-        instr1 = font.render("Используйте ← → для выбора машины", True, BLACK)
-        instr2 = font.render("Стрелки вверх/вниз для выбора цвета", True, BLACK)
-        instr3 = font.render("Цифры 1-3 для выбора времени суток", True, BLACK)
-        instr4 = font.render("Нажмите ENTER для начала игры", True, BLACK)
-        
-        screen.blit(instr1, (SCREEN_WIDTH//2 - instr1.get_width()//2, SCREEN_HEIGHT - 140))
-        screen.blit(instr2, (SCREEN_WIDTH//2 - instr2.get_width()//2, SCREEN_HEIGHT - 110))
-        screen.blit(instr3, (SCREEN_WIDTH//2 - instr3.get_width()//2, SCREEN_HEIGHT - 80))
-        screen.blit(instr4, (SCREEN_WIDTH//2 - instr4.get_width()//2, SCREEN_HEIGHT - 50))
+        draw_text("Используйте ← → для выбора машины", 30, BLACK, (SCREEN_WIDTH//2, SCREEN_HEIGHT - 140), center=True)
+        draw_text("Стрелки вверх/вниз для выбора цвета", 30, BLACK, (SCREEN_WIDTH//2, SCREEN_HEIGHT - 110), center=True)
+        draw_text("Цифры 1-3 для выбора времени суток", 30, BLACK, (SCREEN_WIDTH//2, SCREEN_HEIGHT - 80), center=True)
+        draw_text("Нажмите ENTER для начала игры", 30, BLACK, (SCREEN_WIDTH//2, SCREEN_HEIGHT - 50), center=True)
     
     def handle_input(self, event):
         if event.type == pygame.KEYDOWN:
@@ -519,77 +1736,1417 @@ class CarSelection:
         return None
     
     def update_car_surface(self):
-        self.car_surfaces[self.selected_index] = create_car_surface(
+        self.car_surfaces[self.selected_index] = get_car_surface(
             self.color_options[self.selected_color_index], 
             self.cars[self.selected_index]["type"]
         )
 
+# Фоновая подготовка ассетов: меню появляется сразу, а остальное
+# рисуется понемногу в свободное время кадров
+class AssetWarmup:
+    def __init__(self):
+        self.tasks = deque()
+    
+    def add(self, fn, *args):
+        self.tasks.append((fn, args))
+    
+    def step(self, budget=0.004):
+        # Хотя бы одна задача за вызов, дальше — пока не кончится бюджет
+        deadline = time.perf_counter() + budget
+        while self.tasks:
+            fn, args = self.tasks.popleft()
+            fn(*args)
+            if time.perf_counter() >= deadline:
+                break
+        return not self.tasks
+    
+    def done(self):
+        return not self.tasks
+
+def queue_startup_assets(warmup, car_selection):
+    # Атлас с диска грузится одним чтением; если он устарел — пересобирается в фоне
+    warmup.add(sprite_atlas.load_or_queue_build, warmup)
+    for i in range(len(car_selection.cars)):
+        warmup.add(car_selection.bake_car, i)
+    warmup.add(get_person_surface)
+    warmup.add(get_box_surface)
+    warmup.add(get_road_surface)
+    for time_of_day in TIME_OF_DAY_OPTIONS:
+        warmup.add(background_cache.get, time_of_day, screen.get_size())
+    for text, size, color in [("Игра окончена!", 72, RED), ("Победа!", 72, GREEN),
+                              ("Нажмите R для новой игры", 36, WHITE)]:
+        warmup.add(render_text, text, size, color)
+
 # Класс игры
 class Game:
     def __init__(self, car_type="mercedes", car_color=None, time_of_day="day"):
         self.car = Car(car_type, car_color)
-        self.people = []
-        self.boxes = []
-        self.decorations = []
+        self.lifecycle = EntityLifecycle()
+        self.entities = self.lifecycle.store
+        self.grid = self.lifecycle.grid
+        self.people = self.lifecycle.lists[KIND_PERSON]
+        self.boxes = self.lifecycle.lists[KIND_BOX]
+        self.decorations = self.lifecycle.lists[KIND_DECORATION]
         self.score = 0
         self.level = 1
-        self.target = 10  # Цель для первого уровня
+        self.target = START_TARGET  # Цель для первого уровня
+        self.people_hit = 0
         self.game_over = False
         self.win = False
         self.spawn_timer = 0
         self.box_spawn_timer = 0
         self.decoration_timer = 0
-        self.road_lines = []
+        self.road_offset = 0.0
+        self.road_shift = 0.0
         self.time_of_day = time_of_day
-        self.stars = []
-        self.init_road_lines()
+        self.twinkle_stars = []
+        self.tick = 0
+        self.light_layer = None
+        # Счётчики точных столкновений: за последний тик и за всю партию
+        self.collision_counters = {"pixel_tests": 0, "pixel_misses": 0, "pixel_tests_saved": 0,
+                                   "pair_tests": 0, "pair_tests_saved": 0, "pair_overlaps": 0}
+        self.collision_totals = dict(self.collision_counters)
         self.init_stars()
     
     def init_stars(self):
+        # Мерцают звёзды, запечённые в фон, и только вне дороги: дорога в фоне
+        # перекрывает небо
         if self.time_of_day == "night":
-            for _ in range(50):
-                self.stars.append({
-                    "x": random.randint(0, SCREEN_WIDTH),
-                    "y": random.randint(0, SCREEN_HEIGHT//2),
-                    "size": random.randint(1, 3),
-                    "brightness": random.randint(200, 255)
-                })
-    
-    def init_road_lines(self):
-        # Создаем линии разметки на дороге
-        road_center = SCREEN_WIDTH // 2
-        line_spacing = 50
-        for y in range(-40, SCREEN_HEIGHT + 40, line_spacing):
-            self.road_lines.append({"x": road_center - 5, "y": y, "width": 10, "height": 20})
-    
-    def update_road_lines(self):
-        # Обновляем позиции линий разметки
-        for line in self.road_lines:
-            line["y"] += self.car.speed / 2
-            if line["y"] > SCREEN_HEIGHT:
-                line["y"] = -40
+            road_left = (SCREEN_WIDTH - ROAD_WIDTH) // 2
+            self.twinkle_stars = [star for star in create_star_field()
+                                  if not road_left - 20 <= star["x"] <= road_left + ROAD_WIDTH + 20]
+    
+    def update_road(self):
+        # Дорога прокручивается дробным смещением, разметка повторяется с шагом
+        # ROAD_LINE_SPACING, фонари — с кратным ему шагом LAMP_SPACING
+        self.road_shift = self.car.speed / 2
+        self.road_offset = (self.road_offset + self.road_shift) % LAMP_SPACING
+    
+    def render_road_offset(self, alpha=1.0, period=ROAD_LINE_SPACING):
+        # Смещение между прошлым и текущим тиком
+        return (self.road_offset - self.road_shift * (1.0 - alpha)) % period
+    
+    def road_line_positions(self, alpha=1.0):
+        # Координаты штрихов разметки (нужны рендеру «грязных прямоугольников»)
+        x = SCREEN_WIDTH // 2 - 5
+        first = self.render_road_offset(alpha) - ROAD_LINE_SPACING + ROAD_LINE_OFFSET
+        return [(x, first + i * ROAD_LINE_SPACING) for i in range(SCREEN_HEIGHT // ROAD_LINE_SPACING + 1)]
     
     def draw_sky(self):
-        if self.time_of_day == "day":
-            # Дневное небо
-            screen.fill(LIGHT_BLUE)
-            # Солнце
-            pygame.draw.circle(screen, YELLOW, (SCREEN_WIDTH - 100, 100), 40)
-            # Облака
-            for i in range(3):
-                x = (SCREEN_WIDTH // 4) * i + 50
-                y = 80 + (i * 20)
-                pygame.draw.circle(screen, WHITE, (x, y), 20)
-                pygame.draw.circle(screen, WHITE, (x+15, y-10), 15)
-                pygame.draw.circle(screen, WHITE, (x+30, y), 20)
-                pygame.draw.circle(screen, WHITE, (x+15, y+10), 15)
-        
-        elif self.time_of_day == "night":
-            # Ночное небо
-            screen.fill(NIGHT_BLUE)
-            # Луна
-            pygame.draw.circle(screen, MOON_LIGHT, (SCREEN_WIDTH - 100, 100), 30)
-            pygame.draw.circle(screen, NIGHT_BLUE, (SCREEN_WIDTH - 120, 90), 25)
-            # Звезды
-            for star in self.stars:
-                pygame.draw.circle
\ No newline at end of file
+        # Статичная сцена запечена заранее, за кадр — один blit
+        screen.blit(background_cache.get(self.time_of_day, screen.get_size()), (0, 0))
+        if self.time_of_day == "night" and TWINKLE_STARS and governor.settings["stars"] > 0:
+            self.draw_twinkle()
+    
+    def draw_twinkle(self):
+        # Дешёвое мерцание: за кадр перерисовывается лишь каждая восьмая звезда
+        phase = self.tick % 8
+        stars = self.twinkle_stars[:int(len(self.twinkle_stars) * governor.settings["stars"])]
+        for star in stars[phase::8]:
+            brightness = star["brightness"] - (self.tick * 7 + star["x"]) % 60
+            size = star["size"]
+            x, y = (star["x"] - size // 2) * render_scale, (star["y"] - size // 2) * render_scale
+            size = max(1, int(size * render_scale))
+            screen.fill((brightness, brightness, 200), (x, y, size, size))
+    
+    def draw_road(self, alpha=1.0):
+        # Полоса дороги заранее нарисована целиком, кадр — не больше двух blit
+        road = get_road_surface()
+        x = (SCREEN_WIDTH - ROAD_WIDTH) // 2 - 20
+        y = int(self.render_road_offset(alpha))
+        blit(road, (x, y))
+        if y > 0:
+            blit(road, (x, y - road.get_height()))
+    
+    def lamp_positions(self, alpha=1.0):
+        # Фонари по обеим обочинам, прокручиваются вместе с дорогой
+        road_left = (SCREEN_WIDTH - ROAD_WIDTH) // 2
+        first = self.render_road_offset(alpha, LAMP_SPACING) - LAMP_SPACING + LAMP_OFFSET
+        return [(road_left - 14, first + i * LAMP_SPACING, False) for i in range(SCREEN_HEIGHT // LAMP_SPACING + 2)] + \
+               [(road_left + ROAD_WIDTH - 6, first + i * LAMP_SPACING, True) for i in range(SCREEN_HEIGHT // LAMP_SPACING + 2)]
+    
+    def draw_lighting(self, alpha=1.0):
+        # Маски света рассчитаны на полный размер кадра
+        if self.time_of_day not in LIGHT_AMBIENT or not governor.settings["lights"] or render_scale != 1.0:
+            return
+        for x, y, flipped in self.lamp_positions(alpha):
+            blit(get_lamp_surface(flipped), (x, y - 6))
+        
+        if self.light_layer is None or self.light_layer.get_size() != screen.get_size():
+            self.light_layer = pygame.Surface(screen.get_size()).convert()
+        layer = self.light_layer
+        # Темнота и фонари — два blit бесшовной полосы
+        tile = get_light_tile(self.time_of_day)
+        y = int(self.render_road_offset(alpha, LAMP_SPACING))
+        layer.blit(tile, (0, y))
+        if y > 0:
+            layer.blit(tile, (0, y - tile.get_height()))
+        # Фары: два пятна перед машиной
+        mask = get_light_mask(HEADLIGHT_RADIUS, HEADLIGHT_COLOR)
+        x, y = self.car.render_pos(alpha)
+        for beam_x in (x + 12, x + CAR_WIDTH - 12):
+            layer.blit(mask, (beam_x - HEADLIGHT_RADIUS, y - HEADLIGHT_RADIUS * 1.4), special_flags=pygame.BLEND_ADD)
+        screen.blit(layer, (0, 0), special_flags=pygame.BLEND_MULT)
+    
+    def step(self, action=None):
+        # Один тик симуляции без обращения к экрану
+        self.car.prev_x = self.car.x
+        if action in ("left", "right"):
+            self.car.move(action)
+        self.update()
+        return self.get_state()
+    
+    def get_state(self):
+        xs = self.entities.x.tolist()
+        ys = self.entities.y.tolist()
+        return {
+            "tick": self.tick,
+            "score": self.score,
+            "level": self.level,
+            "target": self.target,
+            "game_over": self.game_over,
+            "win": self.win,
+            "car": (self.car.x, self.car.y, self.car.speed),
+            # Координаты забираем из хранилища списками, а не через свойства по одной
+            "people": [(xs[person.slot], ys[person.slot]) for person in self.people if not person.hit],
+            "boxes": [(xs[box.slot], ys[box.slot]) for box in self.boxes]
+        }
+    
+    def update(self):
+        if self.game_over or self.win:
+            self.road_shift = 0.0
+            self.entities.prev_y[:] = self.entities.y
+            return
+        
+        self.tick += 1
+        self.update_road()
+        profiler.mark("update")
+        
+        # Появление людей
+        self.spawn_timer += 1
+        if self.spawn_timer >= PERSON_SPAWN_INTERVAL:
+            self.lifecycle.spawn(KIND_PERSON)
+            self.spawn_timer = 0
+        
+        # Появление коробок
+        self.box_spawn_timer += 1
+        if self.box_spawn_timer >= BOX_SPAWN_INTERVAL:
+            self.lifecycle.spawn(KIND_BOX)
+            self.box_spawn_timer = 0
+        
+        # Появление декораций
+        self.decoration_timer += 1
+        if self.decoration_timer >= DECORATION_SPAWN_INTERVAL:
+            type_name = random.choice(["tree", "house", "rocket"])
+            side = random.choice(["left", "right"])
+            self.lifecycle.spawn(KIND_DECORATION, type_name, side)
+            self.decoration_timer = 0
+        profiler.mark("spawn")
+        
+        # Движение всех сущностей одним проходом
+        entities = self.entities
+        entities.update()
+        profiler.mark("update")
+        
+        # Прямоугольник машины против всех сущностей — один проход по массивам,
+        # маски сравниваются только для тех, кто коснулся машины
+        car = self.car
+        car_mask = car.get_mask()
+        counters = self.collision_counters
+        for name in counters:
+            counters[name] = 0
+        counters["pixel_tests_saved"] = len(self.people) + len(self.boxes)
+        # Один проход на все виды сразу: обычно машину не касается никто
+        touching = entities.collide(car.x, car.y, CAR_WIDTH, CAR_HEIGHT).tolist()
+        kinds = entities.kind
+        for kind, mask in ((KIND_PERSON, get_person_mask()), (KIND_BOX, get_box_mask())):
+            for slot in touching:
+                if kinds[slot] != kind:
+                    continue
+                counters["pixel_tests"] += 1
+                if not masks_overlap(car_mask, car.x, car.y, mask, entities.x[slot], entities.y[slot]):
+                    counters["pixel_misses"] += 1
+                    continue
+                if telemetry.enabled:
+                    telemetry.emit("collision", self.tick, kind="box" if kind == KIND_BOX else "person",
+                                   x=float(entities.x[slot]), y=float(entities.y[slot]), car_x=car.x, speed=car.speed)
+                if kind == KIND_BOX:
+                    self.game_over = True
+                    continue
+                entities.objects[slot].on_hit()
+                self.lifecycle.retire(slot)
+                self.score += 1
+                self.people_hit += 1
+        if self.game_over and telemetry.enabled:
+            telemetry.emit("game_over", self.tick, level=self.level, score=self.score, people_hit=self.people_hit)
+        counters["pixel_tests_saved"] -= counters["pixel_tests"]
+        # Коробки против людей через сетку. В игре эти встречи пока ни на что
+        # не влияют, но счётчики показывают работу широкой фазы в настоящей партии
+        if self.boxes and self.people:
+            grid = self.grid
+            grid.pairs(KIND_BOX, KIND_PERSON)
+            counters["pair_tests"] = grid.candidate_pairs
+            counters["pair_tests_saved"] = grid.all_pairs - grid.candidate_pairs
+            counters["pair_overlaps"] = grid.overlaps
+        for name, value in counters.items():
+            self.collision_totals[name] += value
+        profiler.mark("collision")
+        
+        self.lifecycle.retire_off_screen()
+        self.lifecycle.compact()
+        
+        # Переход на следующий уровень
+        if self.score >= self.target:
+            if telemetry.enabled:
+                telemetry.emit("level_up", self.tick, level=self.level + 1, target=self.target,
+                               speed=self.car.speed, people_hit=self.people_hit)
+            self.level += 1
+            self.score = 0
+            self.target += TARGET_STEP
+            self.car.increase_speed()
+            if self.level > 5:
+                self.win = True
+                if telemetry.enabled:
+                    telemetry.emit("win", self.tick, level=self.level, people_hit=self.people_hit)
+        profiler.mark("update")
+    
+    def pool_stats(self):
+        return self.lifecycle.pool_stats()
+    
+    def entity_stats(self):
+        return self.lifecycle.stats()
+    
+    def collision_stats(self):
+        ticks = max(self.tick, 1)
+        return {name: {"last": self.collision_counters[name], "total": total, "per_tick": total / ticks}
+                for name, total in self.collision_totals.items()}
+    
+    def draw(self, alpha=1.0):
+        # alpha — доля пути от прошлого тика к текущему, для плавной картинки
+        self.draw_sky()
+        profiler.mark("sky")
+        self.draw_road(alpha)
+        profiler.mark("road")
+        
+        # Прореживание декораций по их случайному варианту: набор видимых
+        # стабилен от кадра к кадру, а поток random симуляции не меняется
+        step = governor.settings["decoration_step"]
+        for decoration in self.decorations:
+            if decoration.variant % step == 0:
+                decoration.draw(alpha)
+        profiler.mark("decorations")
+        for person in self.people:
+            person.draw(alpha)
+        for box in self.boxes:
+            box.draw(alpha)
+        self.car.draw(alpha)
+        profiler.mark("entities")
+        self.draw_lighting(alpha)
+        profiler.mark("lighting")
+        
+        for text, size, color, pos, center in self.hud_lines():
+            draw_text(text, size, color, pos, center)
+        profiler.mark("hud")
+    
+    def hud_lines(self):
+        # Счёт и уровень
+        lines = [
+            (f"Очки: {self.score}/{self.target}", 36, WHITE, (10, 10), False),
+            (f"Уровень: {self.level}", 36, WHITE, (10, 50), False)
+        ]
+        
+        if self.game_over:
+            lines.append(("Игра окончена!", 72, RED, (SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 50), True))
+        elif self.win:
+            lines.append(("Победа!", 72, GREEN, (SCREEN_WIDTH//2, SCREEN_HEIGHT//2 - 50), True))
+        
+        if self.game_over or self.win:
+            lines.append(("Нажмите R для новой игры", 36, WHITE, (SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 20), True))
+        return lines
+
+# Режим отрисовки «грязными прямоугольниками»: каждая сущность — спрайт в своём
+# слое LayeredDirty, на экран отправляются только изменившиеся области
+LAYER_ROAD = 1
+LAYER_DECORATIONS = 2
+LAYER_ENTITIES = 3
+LAYER_CAR = 4
+LAYER_HUD = 5
+
+class DirtyRenderer:
+    def __init__(self, game):
+        self.game = game
+        self.group = pygame.sprite.LayeredDirty()
+        self.background = None
+        self.sprites = {}
+        self.hud_sprites = []
+        self.line_surface = pygame.Surface((10, 20))
+        self.line_surface.fill(WHITE)
+        self.line_sprites = []
+        for _ in game.road_line_positions():
+            sprite = pygame.sprite.DirtySprite()
+            sprite.image = self.line_surface
+            sprite.rect = self.line_surface.get_rect()
+            self.group.add(sprite, layer=LAYER_ROAD)
+            self.line_sprites.append(sprite)
+    
+    def sync(self, sprite, image, x, y):
+        if sprite.image is not image:
+            sprite.image = image
+            sprite.rect = image.get_rect()
+            sprite.dirty = 1
+        pos = (int(x), int(y))
+        if sprite.rect.topleft != pos:
+            sprite.rect.topleft = pos
+            sprite.dirty = 1
+    
+    def sync_entity(self, entity, layer, seen, alpha):
+        sprite = self.sprites.get(entity)
+        if sprite is None:
+            sprite = pygame.sprite.DirtySprite()
+            sprite.image = None
+            self.sprites[entity] = sprite
+            self.group.add(sprite, layer=layer)
+        x, y = entity.render_pos(alpha)
+        self.sync(sprite, entity.get_surface(), x, y)
+        seen.add(entity)
+    
+    def draw(self, alpha=1.0):
+        game = self.game
+        
+        background = background_cache.get(game.time_of_day, screen.get_size())
+        if background is not self.background:
+            self.background = background
+            self.group.clear(screen, background)
+            self.group.repaint_rect(screen.get_rect())
+        
+        for sprite, (x, y) in zip(self.line_sprites, game.road_line_positions(alpha)):
+            self.sync(sprite, self.line_surface, x, y)
+        profiler.mark("road")
+        
+        # Спрайты живут, пока жива сущность; пулы переиспользуют объекты,
+        # поэтому спрайт остаётся привязан к тому же объекту
+        seen = set()
+        step = governor.settings["decoration_step"]
+        for decoration in game.decorations:
+            if decoration.variant % step == 0:
+                self.sync_entity(decoration, LAYER_DECORATIONS, seen, alpha)
+        for person in game.people:
+            if not person.hit:
+                self.sync_entity(person, LAYER_ENTITIES, seen, alpha)
+        for box in game.boxes:
+            self.sync_entity(box, LAYER_ENTITIES, seen, alpha)
+        self.sync_entity(game.car, LAYER_CAR, seen, alpha)
+        for entity in [entity for entity in self.sprites if entity not in seen]:
+            self.group.remove(self.sprites.pop(entity))
+        profiler.mark("entities")
+        
+        lines = game.hud_lines()
+        while len(self.hud_sprites) < len(lines):
+            sprite = pygame.sprite.DirtySprite()
+            sprite.image = None
+            self.group.add(sprite, layer=LAYER_HUD)
+            self.hud_sprites.append(sprite)
+        for i, sprite in enumerate(self.hud_sprites):
+            if i < len(lines):
+                text, size, color, (x, y), center = lines[i]
+                image = render_text(text, size, color, governor.settings["antialias"])
+                if center:
+                    x -= image.get_width() // 2
+                self.sync(sprite, image, x, y)
+                if not sprite.visible:
+                    sprite.visible = 1
+            elif sprite.visible:
+                sprite.visible = 0
+        profiler.mark("hud")
+        
+        return self.group.draw(screen)
+
+# Быстрая симуляция без окна, например для проверки баланса на CI
+def run_headless(ticks, seed=None, car_type="mercedes", time_of_day="day"):
+    if seed is not None:
+        random.seed(seed)
+    game = Game(car_type, None, time_of_day)
+    state = game.get_state()
+    start = time.perf_counter()
+    for _ in range(ticks):
+        state = game.step(random.choice(ACTIONS))
+        if state["game_over"] or state["win"]:
+            break
+    elapsed = time.perf_counter() - start
+    return game, state, game.tick / elapsed if elapsed > 0 else 0.0
+
+# Запись и воспроизведение сессии: seed общего random, выбранная машина и
+# по байту действия на тик. Вся случайность симуляции идёт из общего random,
+# поэтому по такому логу игра повторяется тик в тик
+REPLAY_MAGIC = b"GBRP"
+# 2: столкновения по маскам; 3: звёзды ночи не берутся из общего random.
+# Старые записи дают другой исход и не принимаются
+REPLAY_VERSION = 3
+REPLAY_HEADER = struct.Struct("<4sBQB3BB")
+REPLAY_FOOTER = struct.Struct("<iiiIB")
+
+def start_game(car_type="mercedes", car_color=None, time_of_day="day", seed=None):
+    # Новая игра с известным seed, чтобы её можно было записать
+    if seed is None:
+        seed = random.getrandbits(64)
+    random.seed(seed)
+    game = Game(car_type, car_color, time_of_day)
+    game.seed = seed
+    return game
+
+class InputRecorder:
+    def __init__(self, game):
+        self.game = game
+        self.actions = bytearray()
+    
+    def record(self, action):
+        self.actions.append(ACTIONS.index(action))
+    
+    def save(self, path):
+        game = self.game
+        r, g, b = game.car.color
+        flags = int(game.game_over) | int(game.win) << 1
+        with open(path, "wb") as f:
+            f.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, game.seed, CAR_TYPES.index(game.car.type),
+                                       r, g, b, TIME_OF_DAY_OPTIONS.index(game.time_of_day)))
+            # Действия игрока длинными сериями повторяются и отлично сжимаются
+            data = zlib.compress(bytes(self.actions), 9)
+            f.write(struct.pack("<II", len(self.actions), len(data)))
+            f.write(data)
+            f.write(REPLAY_FOOTER.pack(game.score, game.level, game.target, game.tick, flags))
+
+def read_exact(f, size, path):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError(f"{path}: файл записи обрезан")
+    return data
+
+def load_replay(path):
+    # Любое повреждение файла — ValueError, а не ошибка struct или zlib
+    with open(path, "rb") as f:
+        magic, version, seed, car_index, r, g, b, tod_index = REPLAY_HEADER.unpack(
+            read_exact(f, REPLAY_HEADER.size, path))
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path}: не файл записи или неподдерживаемая версия")
+        count, size = struct.unpack("<II", read_exact(f, 8, path))
+        try:
+            actions = zlib.decompress(read_exact(f, size, path))
+        except zlib.error as exc:
+            raise ValueError(f"{path}: повреждён поток действий") from exc
+        score, level, target, tick, flags = REPLAY_FOOTER.unpack(read_exact(f, REPLAY_FOOTER.size, path))
+    if len(actions) != count or max(actions, default=0) >= len(ACTIONS):
+        raise ValueError(f"{path}: повреждён поток действий")
+    if car_index >= len(CAR_TYPES) or tod_index >= len(TIME_OF_DAY_OPTIONS):
+        raise ValueError(f"{path}: неизвестная машина или время суток")
+    return {
+        "seed": seed,
+        "car_type": CAR_TYPES[car_index],
+        "car_color": (r, g, b),
+        "time_of_day": TIME_OF_DAY_OPTIONS[tod_index],
+        "actions": [ACTIONS[a] for a in actions],
+        "result": {"score": score, "level": level, "target": target, "tick": tick,
+                   "game_over": bool(flags & 1), "win": bool(flags & 2)}
+    }
+
+def run_replay(path, render=False):
+    # Воспроизведение без ограничения FPS; отрисовка по желанию
+    replay = load_replay(path)
+    game = start_game(replay["car_type"], replay["car_color"], replay["time_of_day"], replay["seed"])
+    if render:
+        init_display()
+    start = time.perf_counter()
+    for action in replay["actions"]:
+        game.step(action)
+        if render:
+            game.draw()
+            pygame.display.flip()
+    elapsed = time.perf_counter() - start
+    
+    result = {"score": game.score, "level": game.level, "target": game.target, "tick": game.tick,
+              "game_over": game.game_over, "win": game.win}
+    speedup = len(replay["actions"]) / 60 / elapsed if elapsed > 0 else 0.0
+    return result, replay["result"], speedup
+
+# Запись видео геймплея: кадры в уменьшенном виде складываются в заранее
+# выделенное кольцо массивов, по F9 поток-писатель сбрасывает последние
+# секунды на диск, а главный цикл только ставит задачу в очередь. Пока
+# идёт запись, кольцо не перезаписывается — захват на это время приостановлен.
+# Записи — данные пользователя, а не кэш, поэтому лежат в его каталоге данных.
+# Кольцо не больше CAPTURE_BUDGET_MB: запись нужна как раз на слабых машинах,
+# и сотни мегабайт под неё сами вызвали бы подтормаживания
+CAPTURE_FPS = 20
+CAPTURE_SCALE = 0.4
+CAPTURE_BUDGET_MB = 128
+CAPTURE_DIR = os.path.join(user_data_dir(), "captures")
+
+class FrameCapture:
+    def __init__(self, seconds=30, fmt="raw", fps=CAPTURE_FPS, scale=CAPTURE_SCALE, directory=CAPTURE_DIR,
+                 budget_mb=CAPTURE_BUDGET_MB):
+        self.size = (round(SCREEN_WIDTH * scale), round(SCREEN_HEIGHT * scale))
+        self.fps = fps
+        self.format = fmt
+        self.directory = directory
+        # Кадры хранятся в формате экрана как есть: побайтовая копия в разы
+        # дешевле перепаковки в RGB, которая достаётся потоку-писателю.
+        # Кольцо заполняется сразу, чтобы страницы памяти не выделялись посреди игры
+        self.small = pygame.Surface(self.size, 0, screen)
+        frame_bytes = self.size[1] * self.small.get_pitch()
+        self.requested = max(1, int(seconds * fps))
+        self.capacity = max(1, min(self.requested, int(budget_mb * 2 ** 20) // frame_bytes))
+        self.frames = np.zeros((self.capacity, self.size[1], self.small.get_pitch()), dtype=np.uint8)
+        self.frames.fill(0)
+        self.index = 0
+        self.count = 0
+        self.last = 0.0
+        self.grabbed = 0
+        self.paused = 0
+        self.grab_times = deque(maxlen=600)
+        self.saving = threading.Event()
+        self.jobs = queue.Queue()
+        self.saved = []
+        self.failed = []
+        self.thread = threading.Thread(target=self.worker, name="capture-writer", daemon=True)
+        self.thread.start()
+    
+    def grab(self, surface):
+        now = time.perf_counter()
+        if now - self.last < 1 / self.fps:
+            return
+        if self.saving.is_set():
+            self.paused += 1
+            return
+        self.last = now
+        # Уменьшение в переиспользуемую поверхность и копия прямо в ячейку кольца
+        pygame.transform.scale(surface, self.size, self.small)
+        self.frames[self.index] = np.frombuffer(self.small.get_view("1"), dtype=np.uint8).reshape(self.size[1], -1)
+        self.index = (self.index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self.grabbed += 1
+        self.grab_times.append(time.perf_counter() - now)
+    
+    def save(self):
+        # Возвращает путь, куда пишутся кадры, или None, если писать нечего или запись уже идёт
+        if self.saving.is_set() or not self.count:
+            return None
+        self.saving.set()
+        order = [(self.index - self.count + i) % self.capacity for i in range(self.count)]
+        path = os.path.join(self.directory, time.strftime("capture-%Y%m%d-%H%M%S"))
+        self.jobs.put((path, order))
+        return path
+    
+    def worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            # Неудачная запись не должна останавливать поток: следующий F9
+            # попробует снова, а захват кадров продолжится
+            try:
+                self.write(*job)
+            except Exception as exc:
+                self.failed.append((job[0], str(exc)))
+                print(f"capture: не удалось записать {job[0]}: {exc}", file=sys.stderr)
+            finally:
+                self.saving.clear()
+    
+    def write(self, path, order):
+        start = time.perf_counter()
+        os.makedirs(path, exist_ok=True)
+        width, height = self.size
+        # Номера байтов R, G, B внутри 32-битного пикселя экрана
+        channels = [shift // 8 for shift in self.small.get_shifts()[:3]]
+        if self.format == "png":
+            for n, slot in enumerate(order):
+                rgb = self.rgb(slot, channels)
+                image = pygame.image.frombuffer(rgb.tobytes(), (width, height), "RGB")
+                pygame.image.save(image, os.path.join(path, f"{n:05d}.png"))
+        else:
+            # Сырые RGB24 по строкам, кадр за кадром: ffmpeg -f rawvideo -pix_fmt rgb24
+            with open(os.path.join(path, "frames.rgb"), "wb") as f:
+                for slot in order:
+                    f.write(self.rgb(slot, channels).tobytes())
+        elapsed = time.perf_counter() - start
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"width": width, "height": height, "fps": self.fps, "frames": len(order),
+                       "format": self.format, "write_sec": elapsed}, f, indent=1)
+        self.saved.append((path, len(order), elapsed))
+    
+    def rgb(self, slot, channels):
+        width, height = self.size
+        return self.frames[slot].reshape(height, -1, 4)[:, :width, channels]
+    
+    def overhead(self):
+        times = np.array(self.grab_times) * 1000
+        return {
+            "grabbed": self.grabbed,
+            "paused": self.paused,
+            "failed": len(self.failed),
+            "buffer_mb": self.frames.nbytes / 2 ** 20,
+            "mean_ms": float(times.mean()) if len(times) else 0.0,
+            "p99_ms": float(np.percentile(times, 99)) if len(times) else 0.0,
+            "max_ms": float(times.max()) if len(times) else 0.0
+        }
+    
+    def close(self):
+        # Дожидаемся начатой записи, чтобы не оборвать файл на выходе
+        self.jobs.put(None)
+        self.thread.join()
+
+# Телеметрия сессии: события игры копятся в ограниченной очереди, поток-писатель
+# пачками сбрасывает их в JSONL или SQLite (по расширению файла). Кадр только
+# кладёт словарь в deque — append в CPython атомарен и блокировок не берёт.
+# Если писатель не успевает, лишние события отбрасываются и считаются
+TELEMETRY_QUEUE_SIZE = 4096
+TELEMETRY_BATCH = 256
+TELEMETRY_FLUSH_SEC = 1.0
+
+class Telemetry:
+    def __init__(self, capacity=TELEMETRY_QUEUE_SIZE, batch=TELEMETRY_BATCH, interval=TELEMETRY_FLUSH_SEC):
+        self.enabled = False
+        self.capacity = capacity
+        self.batch = batch
+        self.interval = interval
+        self.events = deque()
+        self.path = None
+        self.sqlite = False
+        self.session = None
+        self.emitted = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.errors = 0
+        self.last_error = None
+        self.wake = threading.Event()
+        self.stop = threading.Event()
+        self.thread = None
+    
+    def open(self, path):
+        self.path = path
+        self.sqlite = path.endswith((".db", ".sqlite", ".sqlite3"))
+        self.session = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.enabled = True
+        self.thread = threading.Thread(target=self.worker, name="telemetry-writer", daemon=True)
+        self.thread.start()
+    
+    def emit(self, event, tick=None, **data):
+        if not self.enabled:
+            return
+        self.emitted += 1
+        if len(self.events) >= self.capacity:
+            self.dropped += 1
+            return
+        self.events.append((time.time(), tick, event, data))
+        if len(self.events) == self.batch:
+            # Пачка набралась — будим писателя раньше таймера
+            self.wake.set()
+    
+    def connect(self):
+        if self.sqlite:
+            sink = sqlite3.connect(self.path)
+            sink.execute("CREATE TABLE IF NOT EXISTS events "
+                         "(session TEXT, time REAL, tick INTEGER, event TEXT, data TEXT)")
+            return sink
+        return open(self.path, "a", encoding="utf-8")
+    
+    def write(self, sink, batch):
+        if self.sqlite:
+            sink.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?)",
+                             [(self.session, t, tick, event, json.dumps(data))
+                              for t, tick, event, data in batch])
+            sink.commit()
+        else:
+            sink.write("".join(json.dumps({"session": self.session, "time": t, "tick": tick,
+                                           "event": event, **data}, ensure_ascii=False) + "\n"
+                               for t, tick, event, data in batch))
+            sink.flush()
+    
+    def release(self, sink):
+        if sink is not None:
+            try:
+                sink.close()
+            except Exception:
+                pass
+    
+    def worker(self):
+        # Приёмник открывается при первой пачке. Ошибка стоит только этой
+        # пачки: она считается потерянной, приёмник закрывается и на
+        # следующей пачке открывается заново, а поток продолжает работать
+        sink = None
+        try:
+            while True:
+                stopping = self.stop.is_set()
+                while self.events:
+                    batch = []
+                    while self.events and len(batch) < self.batch:
+                        batch.append(self.events.popleft())
+                    try:
+                        if sink is None:
+                            sink = self.connect()
+                        self.write(sink, batch)
+                    except Exception as exc:
+                        self.release(sink)
+                        sink = None
+                        self.failed += len(batch)
+                        self.errors += 1
+                        if str(exc) != self.last_error:
+                            print(f"telemetry: не удалось записать {self.path}: {exc}", file=sys.stderr)
+                        self.last_error = str(exc)
+                        continue
+                    self.written += len(batch)
+                    self.batches += 1
+                if stopping:
+                    return
+                self.wake.wait(self.interval)
+                self.wake.clear()
+        finally:
+            self.release(sink)
+    
+    def close(self):
+        # Остаток очереди дописывается перед выходом
+        if self.thread is None:
+            return
+        self.enabled = False
+        self.stop.set()
+        self.wake.set()
+        self.thread.join()
+        self.thread = None
+    
+    def stats(self):
+        return {
+            "emitted": self.emitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "failed": self.failed,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "queued": len(self.events)
+        }
+
+telemetry = Telemetry()
+
+# Подбор баланса: тысячи партий без окна на пуле процессов. Каждая партия
+# задаёт свои значения констант баланса и водит машину простой политикой
+SWEEP_DEFAULTS = {
+    "SPEED_INCREMENT": SPEED_INCREMENT,
+    "MAX_SPEED": MAX_SPEED,
+    "START_TARGET": START_TARGET,
+    "TARGET_STEP": TARGET_STEP,
+    "PERSON_SPAWN_INTERVAL": PERSON_SPAWN_INTERVAL,
+    "BOX_SPAWN_INTERVAL": BOX_SPAWN_INTERVAL,
+    "DECORATION_SPAWN_INTERVAL": DECORATION_SPAWN_INTERVAL,
+    "PERSON_SPEED_RANGE": PERSON_SPEED_RANGE,
+    "BOX_SPEED_RANGE": BOX_SPEED_RANGE
+}
+SWEEP_GRID = {
+    "SPEED_INCREMENT": [0.1, 0.2, 0.4],
+    "START_TARGET": [5, 10, 15],
+    "PERSON_SPAWN_INTERVAL": [40, 60, 90],
+    "BOX_SPAWN_INTERVAL": [60, 90, 120]
+}
+SWEEP_MAX_TICKS = 60 * 60 * 5  # пять минут игры
+SWEEP_METRICS = ["level", "people_hit", "hits_per_minute", "survival_sec", "win"]
+
+def scripted_policy(game, rng):
+    # Едет к ближайшему человеку впереди и уходит от коробок на своей полосе
+    car = game.car
+    center = car.x + CAR_WIDTH / 2
+    for box in game.boxes:
+        if car.y - 200 < box.y < car.y + CAR_HEIGHT and abs(box.x + BOX_WIDTH / 2 - center) < CAR_WIDTH:
+            return "left" if box.x + BOX_WIDTH / 2 > center else "right"
+    target = None
+    for person in game.people:
+        if not person.hit and person.y < car.y and (target is None or person.y > target.y):
+            target = person
+    if target is None:
+        return None
+    dx = target.x + PERSON_WIDTH / 2 - center
+    if abs(dx) < car.speed:
+        return None
+    return "right" if dx > 0 else "left"
+
+def random_policy(game, rng):
+    # Случайное руление с инерцией, чтобы машина не дрожала на месте
+    if rng.random() < 0.1:
+        game.policy_action = rng.choice(ACTIONS)
+    return getattr(game, "policy_action", None)
+
+SWEEP_POLICIES = {"scripted": scripted_policy, "random": random_policy}
+
+def run_sweep_task(task):
+    # Выполняется в процессе пула: константы баланса — глобальные, их
+    # выставляем целиком для каждой партии
+    params_index, params, seed, policy_name = task
+    globals().update(SWEEP_DEFAULTS)
+    globals().update(params)
+    policy = SWEEP_POLICIES[policy_name]
+    rng = random.Random(seed)
+    game = start_game(seed=seed)
+    while not (game.game_over or game.win) and game.tick < SWEEP_MAX_TICKS:
+        game.step(policy(game, rng))
+    minutes = game.tick / 60 / 60
+    return params_index, {
+        "level": game.level,
+        "people_hit": game.people_hit,
+        "hits_per_minute": game.people_hit / minutes if minutes else 0.0,
+        "survival_sec": game.tick / 60,
+        "win": float(game.win)
+    }
+
+def run_sweep_chunk(chunk):
+    return [run_sweep_task(task) for task in chunk]
+
+class RunningStats:
+    # Среднее и разброс по алгоритму Уэлфорда: результаты не копятся в памяти
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+    
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+    
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+def sweep_grid(grid):
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        yield dict(zip(names, (tuple(v) if isinstance(v, list) else v for v in values)))
+
+def run_sweep(grid, runs=20, seed=0, policy="scripted", workers=None):
+    param_sets = list(sweep_grid(grid))
+    tasks = ((i, params, seed * 1000003 + i * runs + run, policy)
+             for i, params in enumerate(param_sets) for run in range(runs))
+    stats = [{metric: RunningStats() for metric in SWEEP_METRICS} for _ in param_sets]
+    
+    def collect(futures):
+        for future in futures:
+            for params_index, result in future.result():
+                for metric in SWEEP_METRICS:
+                    stats[params_index][metric].add(result[metric])
+    
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Крупные пачки задач, чтобы накладные расходы пула не съедали выигрыш.
+        # В работе не больше window пачек: задачи порождаются по мере
+        # готовности результатов, а не все сразу
+        chunksize = max(1, len(param_sets) * runs // (workers * 8))
+        window = workers * 2
+        pending = set()
+        while True:
+            chunk = list(itertools.islice(tasks, chunksize))
+            if not chunk:
+                break
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(run_sweep_chunk, chunk))
+        collect(as_completed(pending))
+    elapsed = time.perf_counter() - start
+    return param_sets, stats, elapsed
+
+def print_sweep_summary(param_sets, stats, elapsed, out=None):
+    names = list(param_sets[0]) if param_sets else []
+    header = names + [f"{metric}_mean" for metric in SWEEP_METRICS] + ["hits_per_minute_std", "runs"]
+    rows = []
+    for params, metric_stats in zip(param_sets, stats):
+        rows.append([params[name] for name in names] +
+                    [round(metric_stats[metric].mean, 3) for metric in SWEEP_METRICS] +
+                    [round(metric_stats["hits_per_minute"].std(), 3), metric_stats["level"].count])
+    print("\t".join(header))
+    for row in rows:
+        print("\t".join(str(value) for value in row))
+    total = sum(row[-1] for row in rows)
+    print(f"{total} runs in {elapsed:.1f}s ({total / elapsed:.1f} runs/s)")
+    if out:
+        with open(out, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+# Векторная среда для обучения агентов: N независимых партий в одном процессе
+# шагают синхронно. У каждой партии своё состояние random — перед её тиком оно
+# подставляется в общий генератор, так что партия повторяет start_game(seed)
+# тик в тик. Наблюдения пишутся на месте в заранее выделенные массивы NumPy
+ENV_NEAREST = 4       # сколько ближайших людей и коробок попадает в вектор состояния
+ENV_FRAME_SCALE = 0.125
+ENV_REWARDS = {"people_hit": 1.0, "boxes_hit": -10.0, "level_ups": 5.0}
+
+class VectorEnv:
+    def __init__(self, count, obs="state", seed=0, car_type="mercedes", time_of_day="day"):
+        self.count = count
+        self.obs_mode = obs
+        self.seed = seed
+        self.car_type = car_type
+        self.time_of_day = time_of_day
+        self.episodes = 0
+        self.games = [None] * count
+        self.rng_states = [None] * count
+        self.rewards = np.zeros(count, dtype=np.float32)
+        self.dones = np.zeros(count, dtype=bool)
+        self.info = {name: np.zeros(count, dtype=np.int32) for name in ENV_REWARDS}
+        if obs == "state":
+            self.states = np.zeros((count, 4 + 6 * ENV_NEAREST), dtype=np.float32)
+            self.observations = self.states
+        else:
+            # Кадры рисуются прямо в память общего массива: поверхность каждой
+            # среды создана поверх своего среза через frombuffer, копий нет
+            width, height = round(SCREEN_WIDTH * ENV_FRAME_SCALE), round(SCREEN_HEIGHT * ENV_FRAME_SCALE)
+            self.frames = np.zeros((count, height, width, 4), dtype=np.uint8)
+            self.surfaces = [pygame.image.frombuffer(self.frames[i], (width, height), "RGBX") for i in range(count)]
+            self.observations = self.frames[..., :3]
+        for i in range(count):
+            self.reset(i)
+        self.observe()
+    
+    def reset(self, i):
+        state = random.getstate()
+        game = start_game(self.car_type, None, self.time_of_day, self.seed + self.episodes)
+        self.episodes += 1
+        self.games[i] = game
+        self.rng_states[i] = random.getstate()
+        random.setstate(state)
+    
+    def step(self, actions):
+        # actions — индексы в ACTIONS, по одному на среду
+        state = random.getstate()
+        for i, game in enumerate(self.games):
+            random.setstate(self.rng_states[i])
+            score, level, people_hit = game.score, game.level, game.people_hit
+            game.step(ACTIONS[actions[i]])
+            self.rng_states[i] = random.getstate()
+            
+            self.info["people_hit"][i] = game.people_hit - people_hit
+            self.info["boxes_hit"][i] = int(game.game_over)
+            self.info["level_ups"][i] = game.level - level
+            self.dones[i] = game.game_over or game.win
+        random.setstate(state)
+        
+        self.rewards[:] = 0.0
+        for name, weight in ENV_REWARDS.items():
+            self.rewards += weight * self.info[name]
+        # Завершившиеся партии сразу начинаются заново со следующим seed
+        for i in np.flatnonzero(self.dones):
+            self.reset(i)
+        self.observe()
+        return self.observations, self.rewards, self.dones, self.info
+    
+    def observe(self):
+        if self.obs_mode == "state":
+            for i, game in enumerate(self.games):
+                self.fill_state(self.states[i], game)
+        else:
+            for surface, game in zip(self.surfaces, self.games):
+                draw_to(surface, ENV_FRAME_SCALE, game.draw)
+    
+    def fill_state(self, row, game):
+        # Машина: положение, скорость, уровень и прогресс; дальше ближайшие люди
+        # и коробки: смещение относительно машины и флаг присутствия
+        car = game.car
+        row[:4] = (car.x / SCREEN_WIDTH, car.speed / MAX_SPEED, game.level / 5, game.score / game.target)
+        store = game.entities
+        cx, cy = car.x + CAR_WIDTH / 2, car.y + CAR_HEIGHT / 2
+        for k, kind in enumerate((KIND_PERSON, KIND_BOX)):
+            slots = np.flatnonzero(store.alive & (store.kind == kind))
+            features = row[4 + k * 3 * ENV_NEAREST:4 + (k + 1) * 3 * ENV_NEAREST].reshape(ENV_NEAREST, 3)
+            features[:] = 0.0
+            if not len(slots):
+                continue
+            dx = (store.x[slots] + store.width[slots] / 2 - cx) / SCREEN_WIDTH
+            dy = (store.y[slots] + store.height[slots] / 2 - cy) / SCREEN_HEIGHT
+            nearest = np.argsort(dx * dx + dy * dy)[:ENV_NEAREST]
+            features[:len(nearest), 0] = dx[nearest]
+            features[:len(nearest), 1] = dy[nearest]
+            features[:len(nearest), 2] = 1.0
+
+def run_env_benchmark(count, steps, obs="state", seed=0):
+    # Пропускная способность в шагах среды в секунду (шаг каждой из count сред)
+    env = VectorEnv(count, obs, seed)
+    rng = np.random.default_rng(seed)
+    actions = rng.integers(0, len(ACTIONS), size=(steps, count))
+    start = time.perf_counter()
+    for t in range(steps):
+        env.step(actions[t])
+    elapsed = time.perf_counter() - start
+    return env, count * steps / elapsed if elapsed > 0 else 0.0
+
+# Бенчмарки горячих путей: генерация ассетов, тики симуляции, отрисовка кадра.
+# Результат — JSON, который можно сравнить с сохранённой базовой линией
+
+def time_per_op(fn, number, repeat=5):
+    # Медиана из нескольких прогонов, в микросекундах на вызов
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    samples.sort()
+    per_op = samples[len(samples) // 2]
+    return {"per_op_us": per_op * 1e6, "ops_per_sec": 1.0 / per_op if per_op > 0 else 0.0}
+
+def populate(game, count):
+    # Держим на дороге ровно count живых людей и коробок
+    lifecycle = game.lifecycle
+    while len(game.people) + len(game.boxes) < count:
+        kind = KIND_PERSON if (len(game.people) + len(game.boxes)) % 2 == 0 else KIND_BOX
+        entity = lifecycle.spawn(kind)
+        entity.y = random.uniform(-100, SCREEN_HEIGHT)
+
+def run_benchmarks(seed=0, repeat=5):
+    # Без окна: SDL рисует в память через драйвер dummy
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    pygame.display.quit()
+    pygame.display.init()
+    init_display()
+    results = {}
+    
+    for car_type in CAR_TYPES:
+        results[f"asset.car.{car_type}"] = time_per_op(lambda: create_car_surface(RED, car_type), 50, repeat)
+    for type_name, factory in DECORATION_FACTORIES.items():
+        rng = random.Random(seed)
+        results[f"asset.{type_name}"] = time_per_op(lambda: factory(rng), 50, repeat)
+    
+    for count in (10, 100, 1000):
+        random.seed(seed)
+        game = Game()
+        lifecycle = game.lifecycle
+        for kind in lifecycle.caps:
+            lifecycle.caps[kind] = max(lifecycle.caps[kind], count)
+        populate(game, count)
+        
+        def tick():
+            # Проигрыш и победа остановили бы симуляцию, и замер шёл бы по пустому тику
+            game.game_over = False
+            game.win = False
+            game.step(None)
+            populate(game, count)
+        results[f"sim.tick.{count}"] = time_per_op(tick, 200, repeat)
+        results[f"sim.pairs.{count}"] = time_per_op(lambda: game.grid.pairs(KIND_BOX, KIND_PERSON), 200, repeat)
+    
+    for time_of_day in ("day", "night", "sunset"):
+        random.seed(seed)
+        game = Game("mercedes", None, time_of_day)
+        for _ in range(120):
+            game.step(None)
+        game.game_over = False
+        
+        def frame():
+            game.draw()
+            pygame.display.flip()
+        frame()
+        results[f"render.frame.{time_of_day}"] = time_per_op(frame, 100, repeat)
+    
+    return {
+        "meta": {
+            "seed": seed,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "numpy": np.__version__,
+            "machine": platform.machine()
+        },
+        "results": results
+    }
+
+def compare_benchmarks(current, baseline, threshold=0.10):
+    # Возвращает список регрессий: замедление больше threshold относительно базы
+    regressions = []
+    print(f"{'benchmark':<28}{'baseline us':>14}{'current us':>14}{'change':>10}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<28}{'-':>14}{result['per_op_us']:>14.1f}{'new':>10}")
+            continue
+        change = result["per_op_us"] / base["per_op_us"] - 1.0
+        flag = " !" if change > threshold else ""
+        print(f"{name:<28}{base['per_op_us']:>14.1f}{result['per_op_us']:>14.1f}{change:>+9.1%}{flag}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+# Фиксированный шаг симуляции: вся механика рассчитана на тик длиной 1/60 с,
+# отрисовка идёт с любой частотой и интерполирует положения между тиками
+SIM_DT = 1 / 60
+MAX_CATCHUP_STEPS = 5  # больше тиков за кадр не догоняем, иначе «спираль смерти»
+MAX_FRAME_SKIP = 3     # сколько кадров подряд можно не рисовать, когда не успеваем
+
+# Главный цикл
+def main(render_mode="full", profile_out=None, record_path=None, measure_startup=False, fps=60, quality="auto",
+         capture_seconds=None, capture_format="raw", telemetry_path=None, capture_budget=CAPTURE_BUDGET_MB):
+    init_display()
+    car_selection = CarSelection()
+    warmup = AssetWarmup()
+    queue_startup_assets(warmup, car_selection)
+    first_frame = True
+    game = None
+    settings = None
+    recorder = None
+    profiler.enabled = True
+    governor.set_budget(fps)
+    if render_mode == "dirty":
+        # Низкое разрешение несовместимо с «грязными прямоугольниками»
+        governor.max_tier = max(i for i, tier in enumerate(QUALITY_TIERS) if tier["scale"] == 1.0)
+    if quality == "auto":
+        governor.enabled = True
+    else:
+        governor.set_tier(int(quality))
+    capture = None
+    if capture_seconds:
+        capture = FrameCapture(capture_seconds, capture_format, budget_mb=capture_budget)
+        note = f" (запрошено {capture_seconds:.0f} с, предел --capture-mb)" if capture.capacity < capture.requested else ""
+        print(f"capture: кольцо {capture.frames.nbytes / 2 ** 20:.0f} МБ — последние "
+              f"{capture.capacity / capture.fps:.0f} с при {capture.fps} кадр/с{note}")
+    if telemetry_path:
+        telemetry.open(telemetry_path)
+    accumulator = 0.0
+    skipped = 0
+    previous = time.perf_counter()
+    
+    while True:
+        now = time.perf_counter()
+        accumulator += now - previous
+        previous = now
+        profiler.begin_frame()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                if profile_out:
+                    profiler.dump(profile_out)
+                if recorder is not None:
+                    recorder.save(record_path)
+                if capture is not None:
+                    capture.close()
+                    stats = capture.overhead()
+                    print(f"capture: frames={stats['grabbed']} paused={stats['paused']} failed={stats['failed']} "
+                          f"buffer={stats['buffer_mb']:.0f}MB overhead mean={stats['mean_ms']:.2f}ms "
+                          f"p99={stats['p99_ms']:.2f}ms max={stats['max_ms']:.2f}ms")
+                if telemetry_path:
+                    telemetry.close()
+                    stats = telemetry.stats()
+                    print(f"telemetry: written={stats['written']} dropped={stats['dropped']} "
+                          f"failed={stats['failed']} batches={stats['batches']} -> {telemetry_path}")
+                    if stats["last_error"]:
+                        print(f"telemetry: ошибок записи {stats['errors']}, последняя: {stats['last_error']}",
+                              file=sys.stderr)
+                pygame.quit()
+                sys.exit()
+            
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.overlay = not profiler.overlay
+                continue
+            
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F9 and capture is not None:
+                path = capture.save()
+                if path:
+                    print(f"capture: последние {capture.count / capture.fps:.0f} с -> {path}")
+                continue
+            
+            if game is None:
+                settings = car_selection.handle_input(event)
+                if settings:
+                    game = start_game(settings["car_type"], settings["car_color"], settings["time_of_day"])
+                    telemetry.emit("car_selected", 0, car_type=settings["car_type"],
+                                   car_color=list(settings["car_color"]), time_of_day=settings["time_of_day"],
+                                   seed=game.seed)
+                    renderer = DirtyRenderer(game) if render_mode == "dirty" else None
+                    # Пишется последняя сыгранная партия
+                    recorder = InputRecorder(game) if record_path else None
+                    accumulator = 0.0
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_r and (game.game_over or game.win):
+                    game = None
+                elif event.key == pygame.K_ESCAPE:
+                    game = None
+                if game is None and recorder is not None:
+                    recorder.save(record_path)
+                    recorder = None
+        
+        if game is None:
+            car_selection.draw()
+            pygame.display.flip()
+            if first_frame:
+                first_frame = False
+                if measure_startup:
+                    print(f"first_frame_ms={(time.perf_counter() - START_TIME) * 1000:.1f}")
+            elif not warmup.done():
+                warmup.step()
+                if measure_startup and warmup.done():
+                    print(f"assets_ready_ms={(time.perf_counter() - START_TIME) * 1000:.1f}")
+                    pygame.quit()
+                    return
+        else:
+            keys = pygame.key.get_pressed()
+            action = None
+            if keys[pygame.K_LEFT] and not keys[pygame.K_RIGHT]:
+                action = "left"
+            elif keys[pygame.K_RIGHT] and not keys[pygame.K_LEFT]:
+                action = "right"
+            profiler.mark("input")
+            
+            steps = 0
+            while accumulator >= SIM_DT and steps < MAX_CATCHUP_STEPS:
+                if recorder is not None and not (game.game_over or game.win):
+                    recorder.record(action)
+                game.step(action)
+                accumulator -= SIM_DT
+                steps += 1
+            if accumulator >= SIM_DT:
+                # Не догнали: сначала пропускаем отрисовку, симуляция при этом
+                # не теряет ни тика; если и это не помогло — остаток выбрасываем
+                if skipped < MAX_FRAME_SKIP:
+                    skipped += 1
+                    profiler.end_frame()
+                    clock.tick(fps)
+                    continue
+                accumulator %= SIM_DT
+            skipped = 0
+            alpha = accumulator / SIM_DT
+            
+            if renderer is not None:
+                rects = renderer.draw(alpha)
+                if profiler.overlay:
+                    rects.append(profiler.draw_overlay(clock.get_fps()))
+                    # Под оверлеем в следующем кадре нужно восстановить фон
+                    renderer.group.repaint_rect(rects[-1])
+                    profiler.mark("hud")
+                if capture is not None:
+                    capture.grab(screen)
+                    profiler.mark("capture")
+                pygame.display.update(rects)
+            else:
+                if governor.settings["scale"] != 1.0:
+                    governor.draw_scaled(lambda: game.draw(alpha))
+                else:
+                    game.draw(alpha)
+                if profiler.overlay:
+                    profiler.draw_overlay(clock.get_fps())
+                    profiler.mark("hud")
+                if capture is not None:
+                    capture.grab(screen)
+                    profiler.mark("capture")
+                pygame.display.flip()
+            profiler.mark("present")
+            profiler.end_frame()
+            governor.record(time.perf_counter() - now)
+        
+        clock.tick(fps)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Городское безумие")
+    parser.add_argument("--headless", type=int, metavar="TICKS",
+                        help="прогнать симуляцию без окна заданное число тиков")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--render", choices=["full", "dirty"], default="full",
+                        help="full — перерисовка всего кадра, dirty — только изменившиеся области")
+    parser.add_argument("--profile-out", metavar="PATH",
+                        help="при выходе записать трассу кадров в CSV или JSON (по расширению)")
+    parser.add_argument("--bench", metavar="OUT.json",
+                        help="прогнать бенчмарки и записать результат в JSON")
+    parser.add_argument("--bench-baseline", metavar="BASE.json",
+                        help="сравнить результат бенчмарков с сохранённой базой")
+    parser.add_argument("--bench-threshold", type=float, default=0.10,
+                        help="допустимое замедление относительно базы (доля)")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="ограничение частоты кадров (0 — без ограничения); темп игры от него не зависит")
+    parser.add_argument("--quality", choices=["auto"] + [str(i) for i in range(len(QUALITY_TIERS))], default="auto",
+                        help="уровень качества графики: auto — подстраивать под бюджет кадра, число — зафиксировать")
+    parser.add_argument("--build-atlas", action="store_true",
+                        help="пересобрать атлас спрайтов на диске и выйти")
+    parser.add_argument("--env-bench", type=int, metavar="N",
+                        help="замерить шаги в секунду векторной среды из N партий")
+    parser.add_argument("--env-steps", type=int, default=1000, help="шагов на замер векторной среды")
+    parser.add_argument("--env-obs", choices=["state", "pixels"], default="state",
+                        help="наблюдения: вектор состояния или уменьшенный кадр")
+    parser.add_argument("--capture", type=float, metavar="SECONDS",
+                        help="держать в памяти последние SECONDS секунд игры; F9 сохраняет их на диск")
+    parser.add_argument("--capture-mb", type=float, default=CAPTURE_BUDGET_MB, metavar="MB",
+                        help="предел памяти под кольцо кадров --capture")
+    parser.add_argument("--capture-format", choices=["raw", "png"], default="raw",
+                        help="raw — один файл RGB24, png — последовательность кадров")
+    parser.add_argument("--telemetry", metavar="PATH",
+                        help="писать события сессии в JSONL или SQLite (.db/.sqlite)")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="замерить время до первого кадра и до готовности ассетов и выйти")
+    parser.add_argument("--sweep", action="store_true",
+                        help="перебор параметров баланса на пуле процессов")
+    parser.add_argument("--sweep-grid", metavar="GRID.json",
+                        help="сетка параметров: {\"ИМЯ_КОНСТАНТЫ\": [значения, ...]}")
+    parser.add_argument("--sweep-runs", type=int, default=20, help="партий на набор параметров")
+    parser.add_argument("--sweep-policy", choices=sorted(SWEEP_POLICIES), default="scripted")
+    parser.add_argument("--sweep-out", metavar="OUT.csv", help="записать сводную таблицу в CSV")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — все ядра)")
+    parser.add_argument("--record", metavar="PATH",
+                        help="записать seed и ввод последней партии в бинарный лог")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="воспроизвести запись без ограничения FPS и сверить результат")
+    parser.add_argument("--replay-render", action="store_true",
+                        help="при воспроизведении ещё и рисовать кадры")
+    args = parser.parse_args()
+    
+    if args.sweep:
+        grid = SWEEP_GRID
+        if args.sweep_grid:
+            with open(args.sweep_grid, encoding="utf-8") as f:
+                grid = json.load(f)
+            unknown = set(grid) - set(SWEEP_DEFAULTS)
+            if unknown:
+                parser.error(f"неизвестные параметры баланса: {', '.join(sorted(unknown))}")
+        param_sets, stats, elapsed = run_sweep(grid, args.sweep_runs, args.seed or 0,
+                                               args.sweep_policy, args.workers)
+        print_sweep_summary(param_sets, stats, elapsed, args.sweep_out)
+    elif args.env_bench:
+        if args.env_obs == "pixels":
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        env, steps_per_sec = run_env_benchmark(args.env_bench, args.env_steps, args.env_obs, args.seed or 0)
+        print(f"envs={env.count} obs={env.obs_mode}{list(env.observations.shape[1:])} steps={args.env_steps} "
+              f"episodes={env.episodes} env_steps_per_sec={steps_per_sec:.0f}")
+    elif args.build_atlas:
+        sprite_atlas.build()
+        stats = sprite_atlas.stats()
+        target = sprite_atlas.image_path if stats["save_error"] is None else "не сохранён"
+        print(f"atlas: sprites={stats['sprites']} size={stats['size'][0]}x{stats['size'][1]} "
+              f"build_ms={stats['build_ms']:.0f} -> {target}")
+    elif args.replay:
+        try:
+            result, expected, speedup = run_replay(args.replay, args.replay_render)
+        except ValueError as exc:
+            parser.error(str(exc))
+        print(f"ticks={result['tick']} score={result['score']} level={result['level']} "
+              f"game_over={result['game_over']} win={result['win']} speedup={speedup:.0f}x")
+        if result != expected:
+            print(f"расхождение с записью: ожидалось {expected}")
+            sys.exit(1)
+        print("результат совпадает с записью")
+    elif args.bench:
+        report = run_benchmarks(args.seed or 0)
+        with open(args.bench, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        if args.bench_baseline:
+            with open(args.bench_baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+            if compare_benchmarks(report, baseline, args.bench_threshold):
+                sys.exit(1)
+        else:
+            for name, result in report["results"].items():
+                print(f"{name:<28}{result['per_op_us']:>12.1f} us{result['ops_per_sec']:>14.0f} ops/s")
+    elif args.headless:
+        game, state, tps = run_headless(args.headless, args.seed)
+        print(f"ticks={state['tick']} score={state['score']} level={state['level']} "
+              f"game_over={state['game_over']} win={state['win']} ticks_per_sec={tps:.0f}")
+        for name, stats in game.pool_stats().items():
+            print(f"pool {name}: high_water={stats['high_water']} created={stats['created']} "
+                  f"reused={stats['reused']} reuse_rate={stats['reuse_rate']:.2f}")
+        for name, stats in game.entity_stats().items():
+            print(f"entities {name}: live={stats['live']} retired={stats['retired']} "
+                  f"rejected={stats['rejected']} cap={stats['cap']}")
+        for name, stats in game.collision_stats().items():
+            print(f"collision {name}: total={stats['total']} per_tick={stats['per_tick']:.2f}")
+    else:
+        main(args.render, args.profile_out, args.record, args.startup_time, args.fps, args.quality,
+             args.capture, args.capture_format, args.telemetry, args.capture_mb)
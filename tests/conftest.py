@@ -0,0 +1,19 @@
+import importlib.util
+import os
+import pathlib
+
+import pytest
+
+# Тесты идут без окна: SDL рисует в память
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+GAME_PATH = pathlib.Path(__file__).resolve().parent.parent / "import pygame.py"
+
+
+@pytest.fixture(scope="session")
+def game_module():
+    # Имя файла с пробелом не импортируется обычным import
+    spec = importlib.util.spec_from_file_location("igra", GAME_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
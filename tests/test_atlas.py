@@ -0,0 +1,89 @@
+import json
+import os
+import shutil
+import sys
+
+import pygame
+import pytest
+
+
+@pytest.fixture(scope="module")
+def built_atlas(game_module, tmp_path_factory):
+    atlas = game_module.SpriteAtlas(str(tmp_path_factory.mktemp("atlas")))
+    atlas.build()
+    return atlas
+
+
+def same_pixels(a, b):
+    return a.get_size() == b.get_size() and pygame.image.tobytes(a, "RGBA") == pygame.image.tobytes(b, "RGBA")
+
+
+def test_atlas_loads_from_disk(game_module, built_atlas):
+    atlas = game_module.SpriteAtlas(os.path.dirname(built_atlas.index_path))
+    assert atlas.load()
+    assert atlas.source == "disk"
+    assert set(atlas.sprites) == set(built_atlas.sprites)
+    assert same_pixels(atlas.get("box"), game_module.create_box_surface())
+    assert same_pixels(atlas.get("house/3"), game_module.create_decoration_surface("house", 3))
+
+
+def test_atlas_key_tracks_sprite_list(game_module, built_atlas, monkeypatch):
+    g = game_module
+    assert g.atlas_key(g.atlas_entries()) == built_atlas.key
+    # Другой набор вариантов — другой ключ, старый атлас с диска не подходит
+    monkeypatch.setattr(g, "ATLAS_VARIANTS", g.ATLAS_VARIANTS + 1)
+    atlas = g.SpriteAtlas(os.path.dirname(built_atlas.index_path))
+    assert not atlas.load()
+    assert atlas.key != built_atlas.key
+
+
+def test_atlas_rejects_stale_index(game_module, built_atlas, tmp_path):
+    shutil.copy(built_atlas.image_path, tmp_path / "atlas.png")
+    index_path = tmp_path / "atlas.json"
+    with open(built_atlas.index_path, encoding="utf-8") as f:
+        index = json.load(f)
+    index_path.write_text(json.dumps(index), encoding="utf-8")
+    assert game_module.SpriteAtlas(str(tmp_path)).load()
+    index["key"] = "0" * 40
+    index_path.write_text(json.dumps(index), encoding="utf-8")
+    assert not game_module.SpriteAtlas(str(tmp_path)).load()
+
+
+
+def test_atlas_kept_in_memory_when_directory_is_unwritable(game_module, tmp_path, capsys):
+    blocker = tmp_path / "atlas"
+    blocker.write_text("not a directory")
+    atlas = game_module.SpriteAtlas(str(blocker / "nested"))
+    atlas.build()
+    assert atlas.source == "build"
+    assert atlas.stats()["save_error"]
+    assert same_pixels(atlas.get("box"), game_module.create_box_surface())
+    assert "atlas:" in capsys.readouterr().err
+
+
+@pytest.mark.skipif(sys.platform in ("win32", "darwin"), reason="XDG only on other platforms")
+def test_cache_dir_follows_xdg(game_module, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert game_module.user_cache_dir() == os.path.join(str(tmp_path), game_module.APP_NAME)
+
+
+def test_atlas_key_tracks_sprite_constants(game_module, built_atlas, monkeypatch):
+    g = game_module
+    monkeypatch.setattr(g, "BOX_WIDTH", g.BOX_WIDTH + 2)
+    assert g.atlas_key(g.atlas_entries()) != built_atlas.key
+    monkeypatch.undo()
+    monkeypatch.setattr(g, "ORANGE", (250, 160, 0))
+    assert g.atlas_key(g.atlas_entries()) != built_atlas.key
+
+
+def test_truncated_atlas_image_is_rebuilt(game_module, built_atlas, tmp_path):
+    shutil.copy(built_atlas.index_path, tmp_path / "atlas.json")
+    with open(built_atlas.image_path, "rb") as f:
+        (tmp_path / "atlas.png").write_bytes(f.read(200))
+    atlas = game_module.SpriteAtlas(str(tmp_path))
+    assert not atlas.load()
+    assert atlas.image is None and not atlas.sprites
+
+
+def test_atlas_save_leaves_no_temporary_files(built_atlas):
+    assert sorted(os.listdir(os.path.dirname(built_atlas.index_path))) == ["atlas.json", "atlas.png"]
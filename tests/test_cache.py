@@ -0,0 +1,15 @@
+def test_sprite_cache_holds_every_atlas_sprite(game_module):
+    assert game_module.sprite_cache.max_size >= len(game_module.atlas_entries())
+
+
+def test_scene_surfaces_survive_sprite_churn(game_module):
+    g = game_module
+    tile = g.get_light_tile("night")
+    road = g.get_road_surface()
+    # Без атласа все машины во всех цветах проходят через кэш спрайтов
+    for car_type in g.CAR_TYPES:
+        for color in g.CAR_COLORS:
+            for highlight in (True, False):
+                g.sprite_cache.get(g.create_car_surface, tuple(color), car_type, highlight)
+    assert g.get_light_tile("night") is tile
+    assert g.get_road_surface() is road
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pygame
+import pytest
+
+
+@pytest.fixture
+def capture(game_module, monkeypatch):
+    g = game_module
+    monkeypatch.setattr(g, "screen", pygame.Surface((g.SCREEN_WIDTH, g.SCREEN_HEIGHT), 0, 32))
+    capture = g.FrameCapture(seconds=1, fps=10)
+    yield capture
+    capture.close()
+
+
+def wait_saved(capture, directory):
+    capture.directory = directory
+    path = capture.save()
+    while capture.saving.is_set():
+        capture.thread.join(0.01)
+    return path
+
+
+def save_now(capture, surface, directory):
+    capture.last = 0.0
+    capture.grab(surface)
+    return wait_saved(capture, directory)
+
+
+def test_failed_write_keeps_writer_alive(game_module, capture, tmp_path, capsys):
+    surface = pygame.Surface((game_module.SCREEN_WIDTH, game_module.SCREEN_HEIGHT), 0, 32)
+    blocker = tmp_path / "captures"
+    blocker.write_text("not a directory")
+    assert save_now(capture, surface, str(blocker))
+    assert capture.overhead()["failed"] == 1
+    assert not capture.saved
+    assert "capture:" in capsys.readouterr().err
+    # Поток жив: следующая запись проходит
+    assert capture.thread.is_alive()
+    path = save_now(capture, surface, str(tmp_path / "ok"))
+    assert capture.saved[0][0] == path
+    assert os.path.exists(os.path.join(path, "meta.json"))
+
+
+@pytest.mark.skipif(sys.platform in ("win32", "darwin"), reason="XDG only on other platforms")
+def test_data_dir_follows_xdg(game_module, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path))
+    assert game_module.user_data_dir() == os.path.join(str(tmp_path), game_module.APP_NAME)
+
+
+def test_ring_keeps_last_frames_in_order(game_module, monkeypatch, tmp_path):
+    g = game_module
+    monkeypatch.setattr(g, "screen", pygame.Surface((g.SCREEN_WIDTH, g.SCREEN_HEIGHT), 0, 32))
+    capture = g.FrameCapture(seconds=0.4, fps=10)
+    try:
+        assert capture.capacity == 4
+        surface = pygame.Surface((g.SCREEN_WIDTH, g.SCREEN_HEIGHT), 0, 32)
+        # Шесть кадров в кольцо на четыре: остаются 3, 4, 5, 6 в порядке съёмки
+        for n in range(1, 7):
+            surface.fill((n * 40, 0, 0))
+            capture.last = 0.0
+            capture.grab(surface)
+        path = wait_saved(capture, str(tmp_path))
+    finally:
+        capture.close()
+    width, height = capture.size
+    with open(os.path.join(path, "frames.rgb"), "rb") as f:
+        data = f.read()
+    assert len(data) == 4 * width * height * 3
+    reds = [data[i * width * height * 3] for i in range(4)]
+    assert reds == [120, 160, 200, 240]
+
+
+def test_ring_respects_memory_budget(game_module, monkeypatch):
+    g = game_module
+    monkeypatch.setattr(g, "screen", pygame.Surface((g.SCREEN_WIDTH, g.SCREEN_HEIGHT), 0, 32))
+    capture = g.FrameCapture(seconds=30, fps=30, budget_mb=2)
+    try:
+        assert capture.requested == 900
+        assert 1 <= capture.capacity < capture.requested
+        assert capture.frames.nbytes <= 2 * 2 ** 20
+    finally:
+        capture.close()
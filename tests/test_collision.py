@@ -0,0 +1,90 @@
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+from conftest import GAME_PATH
+
+
+@pytest.fixture
+def game(game_module):
+    random.seed(0)
+    return game_module.Game("mercedes", None, "day")
+
+
+def place(game, kind, x, y):
+    # Ставим сущность так, чтобы после сдвига в следующем тике она оказалась в (x, y)
+    entity = game.lifecycle.spawn(kind)
+    entity.x = x
+    entity.y = y - entity.speed
+    return entity
+
+
+@pytest.mark.parametrize("car_type", ["mercedes", "bmw", "lamborghini", "zhiguli"])
+def test_car_mask_has_transparent_corners(game_module, car_type):
+    mask = game_module.get_car_mask(car_type)
+    w, h = mask.get_size()
+    assert 0 < mask.count() < w * h
+    assert not mask.get_at((0, 0))
+
+
+def test_box_touching_car_corner_is_not_a_hit(game_module, game):
+    g = game_module
+    car = game.car
+    # Прямоугольники пересекаются в одном пикселе — пустом углу машины
+    place(game, g.KIND_BOX, car.x - g.BOX_WIDTH + 1, car.y - g.BOX_HEIGHT + 1)
+    game.step()
+    assert not game.game_over
+    assert game.collision_counters["pixel_misses"] == 1
+    place(game, g.KIND_BOX, car.x + (g.CAR_WIDTH - g.BOX_WIDTH) / 2, car.y + (g.CAR_HEIGHT - g.BOX_HEIGHT) / 2)
+    game.step()
+    assert game.game_over
+
+
+def test_person_hit_only_on_pixel_contact(game_module, game):
+    g = game_module
+    car = game.car
+    person = place(game, g.KIND_PERSON, car.x - g.PERSON_WIDTH + 1, car.y - g.PERSON_HEIGHT + 1)
+    game.step()
+    assert game.people_hit == 0
+    assert person in game.people and not person.hit
+    person = place(game, g.KIND_PERSON, car.x + (g.CAR_WIDTH - g.PERSON_WIDTH) / 2, car.y)
+    game.step()
+    assert game.people_hit == 1
+    assert person.hit
+    # Сбитый человек убран с дороги и повторно не сталкивается
+    assert person not in game.people
+    game.step()
+    assert game.people_hit == 1
+
+
+def test_masks_overlap_uses_relative_offset(game_module):
+    g = game_module
+    mask = g.get_box_mask()
+    assert g.masks_overlap(mask, 100, 100, mask, 100 + g.BOX_WIDTH - 1, 100)
+    assert not g.masks_overlap(mask, 100, 100, mask, 100 + g.BOX_WIDTH, 100)
+
+
+def test_car_mask_does_not_touch_sprite_cache(game_module):
+    cache = game_module.SpriteCache()
+    cache.get_mask(game_module.create_car_surface, game_module.WHITE, "bmw", False)
+    assert cache.stats()["size"] == 0
+    assert cache.stats()["misses"] == 0
+    assert cache.stats()["masks"] == 1
+
+
+def test_headless_simulation_does_not_load_fonts():
+    # Отдельный процесс: в общем процессе тестов шрифты уже подняты другими тестами
+    code = (
+        "import importlib.util, pygame\n"
+        f"spec = importlib.util.spec_from_file_location('igra', {str(GAME_PATH)!r})\n"
+        "module = importlib.util.module_from_spec(spec)\n"
+        "spec.loader.exec_module(module)\n"
+        "module.run_headless(2000, 0)\n"
+        "print(pygame.font.get_init())\n"
+    )
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, check=True)
+    assert result.stdout.strip().splitlines()[-1] == "False"
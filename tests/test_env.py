@@ -0,0 +1,57 @@
+import random
+
+import numpy as np
+
+
+def test_state_envs_match_standalone_games(game_module):
+    g = game_module
+    env = g.VectorEnv(3, "state", seed=10)
+    assert env.observations.shape == (3, 4 + 6 * g.ENV_NEAREST)
+    actions = np.random.default_rng(0).integers(0, len(g.ACTIONS), size=(200, 3))
+    random.seed(99)
+    outside = random.getstate()
+    traces = [[] for _ in range(3)]
+    for t in range(200):
+        env.step(actions[t])
+        for i, game in enumerate(env.games):
+            traces[i].append((game.tick, game.car.x, game.score))
+    # Шаги сред не сдвигают общий random
+    assert random.getstate() == outside
+
+    # Каждая среда идёт так же, как отдельная игра с тем же seed
+    for i in range(3):
+        game = g.start_game("mercedes", None, "day", 10 + i)
+        expected = []
+        for t in range(200):
+            game.step(g.ACTIONS[actions[t][i]])
+            if game.game_over or game.win:
+                break
+            expected.append((game.tick, game.car.x, game.score))
+        assert traces[i][:len(expected)] == expected
+
+
+def test_state_rows_describe_nearest_entities(game_module):
+    g = game_module
+    env = g.VectorEnv(2, "state", seed=3)
+    for _ in range(120):
+        env.step(np.zeros(2, dtype=np.intp))
+    row = env.observations[0]
+    game = env.games[0]
+    assert row[0] == np.float32(game.car.x / g.SCREEN_WIDTH)
+    present = row[4:4 + 3 * g.ENV_NEAREST].reshape(g.ENV_NEAREST, 3)[:, 2]
+    store = game.entities
+    people = int((store.alive & (store.kind == g.KIND_PERSON)).sum())
+    assert people > 0
+    assert present.sum() == min(people, g.ENV_NEAREST)
+
+
+def test_pixel_observations_share_frame_memory(game_module):
+    g = game_module
+    env = g.VectorEnv(2, "pixels", seed=5)
+    height, width = env.frames.shape[1:3]
+    assert env.observations.shape == (2, height, width, 3)
+    assert np.shares_memory(env.observations, env.frames)
+    before = env.observations.copy()
+    env.step(np.ones(2, dtype=np.intp))
+    assert env.observations.any()
+    assert not np.array_equal(before, env.observations)
@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+
+def brute_force_pairs(g, store, kind_a, kind_b):
+    # Все пары живых людей и коробок с пересечением прямоугольников, O(n^2)
+    def matches(slot, kind):
+        return kind is None or store.kind[slot] == kind
+    
+    def overlap(a, b):
+        return (store.x[a] < store.x[b] + store.width[b] and store.x[a] + store.width[a] > store.x[b] and
+                store.y[a] < store.y[b] + store.height[b] and store.y[a] + store.height[a] > store.y[b])
+    
+    live = [slot for slot in range(store.capacity) if store.alive[slot] and store.kind[slot] != g.KIND_DECORATION]
+    found = set()
+    for a in live:
+        for b in live:
+            if a != b and matches(a, kind_a) and matches(b, kind_b) and overlap(a, b):
+                found.add(frozenset((a, b)))
+    return found
+
+
+def crowded_game(g, seed, count=300):
+    random.seed(seed)
+    game = g.Game("mercedes", None, "day")
+    for kind in game.lifecycle.caps:
+        game.lifecycle.caps[kind] = count
+    g.populate(game, count)
+    return game
+
+
+@pytest.mark.parametrize("count", [8, 40, 400])
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("kinds", [(None, None), ("box", "person"), ("person", None), ("person", "person")])
+def test_pairs_match_brute_force(game_module, seed, kinds, count):
+    # 8, 40 и 400 сущностей — цикл Python, проход NumPy по всем парам и окна сетки
+    g = game_module
+    kind_ids = {None: None, "box": g.KIND_BOX, "person": g.KIND_PERSON}
+    kind_a, kind_b = (kind_ids[kind] for kind in kinds)
+    game = crowded_game(g, seed, count)
+    for _ in range(30):
+        game.game_over = game.win = False
+        game.step(None)
+    first, second = game.grid.pairs(kind_a, kind_b)
+    found = list(zip(first.tolist(), second.tolist()))
+    expected = brute_force_pairs(g, game.entities, kind_a, kind_b)
+    # Каждая пара ровно один раз
+    assert len(found) == len(expected)
+    assert {frozenset(pair) for pair in found} == expected
+    for a, b in found:
+        assert kind_a is None or game.entities.kind[a] == kind_a
+        assert kind_b is None or game.entities.kind[b] == kind_b
+    stats = game.grid.stats()
+    assert stats["overlaps"] == len(found)
+    assert stats["overlaps"] <= stats["candidate_pairs"] <= stats["all_pairs"]
+    if count == 400:
+        # Широкая фаза отсекает большую часть пар
+        assert expected
+        assert stats["candidate_pairs"] < stats["all_pairs"] // 4
+
+
+def test_grid_ignores_removed_and_decorations(game_module):
+    g = game_module
+    game = crowded_game(g, 3, count=100)
+    game.step(None)
+    first, second = game.grid.pairs()
+    assert len(first)
+    for slot in first.tolist() + second.tolist():
+        assert game.entities.alive[slot]
+        assert game.entities.kind[slot] != g.KIND_DECORATION
+
+
+def test_game_reports_pair_counters(game_module):
+    g = game_module
+    game = crowded_game(g, 4, count=6)
+    game.step(None)
+    counters = game.collision_counters
+    stats = game.grid.stats()
+    assert counters["pair_tests"] == stats["candidate_pairs"] > 0
+    assert counters["pair_tests"] + counters["pair_tests_saved"] == stats["all_pairs"]
+    assert counters["pair_overlaps"] == stats["overlaps"]
+    assert game.collision_stats()["pair_tests"]["total"] == counters["pair_tests"]
@@ -0,0 +1,59 @@
+import random
+
+
+def play(g, seed, ticks):
+    # Игра без проигрыша, чтобы на дороге успело смениться много сущностей
+    random.seed(seed)
+    game = g.Game("mercedes", None, "day")
+    rng = random.Random(seed)
+    for _ in range(ticks):
+        game.game_over = False
+        game.step(rng.choice(g.ACTIONS))
+    return game
+
+
+def test_pools_reuse_released_entities(game_module):
+    game = play(game_module, 0, 2000)
+    stats = game.pool_stats()
+    lists = {"person": game.people, "box": game.boxes, "decoration": game.decorations}
+    for name, entities in lists.items():
+        assert stats[name]["reused"] > 0
+        assert stats[name]["live"] == len(entities)
+        assert stats[name]["live"] + stats[name]["free"] == stats[name]["created"]
+
+
+def test_released_entities_free_their_slots(game_module):
+    game = play(game_module, 1, 2000)
+    assert len(game.entities) == len(game.people) + len(game.boxes) + len(game.decorations)
+    assert not any(person.hit for person in game.people)
+
+
+def test_lifecycle_respects_caps(game_module):
+    g = game_module
+    game = play(g, 2, 1000)
+    lifecycle = game.lifecycle
+    for kind in lifecycle.caps:
+        lifecycle.caps[kind] = 3
+    for _ in range(1000):
+        game.game_over = False
+        game.step(None)
+    stats = game.entity_stats()
+    for name in ("person", "box", "decoration"):
+        assert stats[name]["live"] <= 3
+        assert stats[name]["retired"] > 0
+    assert stats["person"]["rejected"] > 0
+
+
+def test_entity_hit_outside_update_is_retired(game_module):
+    g = game_module
+    random.seed(3)
+    game = g.Game("mercedes", None, "day")
+    person = game.lifecycle.spawn(g.KIND_PERSON)
+    person.on_hit()
+    slot = person.slot
+    for _ in range(600):
+        game.game_over = False
+        game.step(None)
+    assert person not in game.people
+    assert game.entities.objects[slot] is not person
+    assert len(game.entities) == len(game.people) + len(game.boxes) + len(game.decorations)
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+
+def record(g, path, seed, ticks=3000):
+    game = g.start_game("zhiguli", None, "night", seed)
+    recorder = g.InputRecorder(game)
+    rng = random.Random(seed)
+    for _ in range(ticks):
+        action = rng.choice(g.ACTIONS)
+        recorder.record(action)
+        game.step(action)
+        if game.game_over or game.win:
+            break
+    recorder.save(path)
+    return game
+
+
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_replay_reproduces_session(game_module, tmp_path, seed):
+    path = tmp_path / "session.rpl"
+    game = record(game_module, path, seed)
+    result, expected, _ = game_module.run_replay(path)
+    assert result == expected
+    assert result["tick"] == game.tick
+    assert result["score"] == game.score
+
+
+def test_replay_ignores_outside_random(game_module, tmp_path):
+    # Запись не зависит от того, что было в общем random до неё
+    path = tmp_path / "session.rpl"
+    record(game_module, path, 3)
+    random.seed(12345)
+    random.random()
+    result, expected, _ = game_module.run_replay(path)
+    assert result == expected
+
+
+def test_replay_rejects_foreign_file(game_module, tmp_path):
+    path = tmp_path / "junk.rpl"
+    path.write_bytes(b"not a replay" * 4)
+    with pytest.raises(ValueError):
+        game_module.load_replay(path)
+
+
+def test_replay_rejects_truncated_file(game_module, tmp_path):
+    path = tmp_path / "session.rpl"
+    record(game_module, path, 5)
+    data = path.read_bytes()
+    cut = tmp_path / "cut.rpl"
+    # Обрезка в заголовке, в потоке действий и в итогах партии
+    for size in range(len(data)):
+        cut.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            game_module.load_replay(cut)
+
+
+@pytest.mark.parametrize("offset", [13, 17])
+def test_replay_rejects_unknown_car_and_time_of_day(game_module, tmp_path, offset):
+    # Байты 13 и 17 заголовка — номер машины и время суток
+    path = tmp_path / "session.rpl"
+    record(game_module, path, 5, ticks=10)
+    data = bytearray(path.read_bytes())
+    data[offset] = 200
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        game_module.load_replay(path)
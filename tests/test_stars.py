@@ -0,0 +1,14 @@
+import random
+
+
+def test_twinkle_stars_sit_on_baked_stars(game_module):
+    g = game_module
+    random.seed(0)
+    game = g.Game("mercedes", None, "night")
+    background = g.create_background_surface("night")
+    assert game.twinkle_stars
+    for star in game.twinkle_stars:
+        r, gr, b = background.get_at((star["x"], star["y"]))[:3]
+        # В центре мерцающей звезды на фоне — звезда, а не пустое небо
+        assert r == gr and b == 200 and r >= 200
+
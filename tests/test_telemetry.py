@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return predicate()
+
+
+@pytest.mark.parametrize("name", ["events.jsonl", "events.db"])
+def test_failed_batch_keeps_writer_alive(game_module, tmp_path, capsys, name):
+    directory = tmp_path / "later"
+    telemetry = game_module.Telemetry(batch=4, interval=0.01)
+    telemetry.open(str(directory / name))
+    for tick in range(4):
+        telemetry.emit("tick", tick)
+    assert wait_for(lambda: telemetry.errors)
+    assert telemetry.thread.is_alive()
+    # Каталог появился — следующая пачка пишется в заново открытый приёмник
+    directory.mkdir()
+    for tick in range(4, 8):
+        telemetry.emit("tick", tick)
+    telemetry.close()
+    stats = telemetry.stats()
+    assert stats["failed"] == 4
+    assert stats["written"] == 4
+    assert stats["last_error"]
+    assert "telemetry:" in capsys.readouterr().err